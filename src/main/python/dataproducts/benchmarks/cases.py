@@ -0,0 +1,152 @@
+"""
+Benchmark cases. Each case prepares its input for a scale and returns the function to time.
+"""
+import pandas as pd
+
+from datetime import datetime
+
+from dataproducts.benchmarks import generators
+from dataproducts.util.tree_utils import CompactTree
+from dataproducts.util.utils import parse_tb, create_json
+
+benchmark_date = datetime(2020, 1, 1)
+
+scales = {
+    'small': {'textbooks': 10, 'depth': 2, 'fan_out': 3, 'channels': 5, 'contents': 500, 'rows': 1000},
+    'medium': {'textbooks': 100, 'depth': 3, 'fan_out': 4, 'channels': 20, 'contents': 5000, 'rows': 10000},
+    'large': {'textbooks': 500, 'depth': 4, 'fan_out': 5, 'channels': 40, 'contents': 50000, 'rows': 100000},
+    # the largest tenants, run it for the per tenant cases, eg: --cases gen_aggregated_report --scales xlarge
+    'xlarge': {'textbooks': 1000, 'depth': 4, 'fan_out': 5, 'channels': 80, 'contents': 500000, 'rows': 1000000}
+}
+
+
+def textbooks(rng_, params_):
+    rows = [generators.textbook_row(rng_, 'channel{:04d}'.format(i % params_['channels']))
+            for i in range(params_['textbooks'])]
+    return [(row, generators.textbook_hierarchy(rng_, row, depth_=params_['depth'], fan_out_=params_['fan_out']))
+            for row in rows]
+
+
+def bench_parse_tb(rng_, params_, work_dir_):
+    data = textbooks(rng_, params_)
+
+    def run():
+        for row, tb in data:
+            parse_tb(tb, [], row)
+    return run
+
+
+def bench_etb_tree(rng_, params_, work_dir_):
+    from dataproducts.services.etb.etb_metrics import ETBMetrics
+    data = textbooks(rng_, params_)
+    etb = ETBMetrics(work_dir_, None, None, None, benchmark_date.strftime('%d/%m/%Y'), None)
+
+    def run():
+        dialcode_etb, textbook_etb, dialcode_dce, textbook_dce = [], [], [], []
+        for row, tb in data:
+            etb.process_textbook(row, tb, dialcode_etb, textbook_etb, dialcode_dce, textbook_dce)
+    return run
+
+
+def unit_children(node_):
+    return [child for child in node_.get('children') or [] if child['contentType'] == 'TextBookUnit']
+
+
+def bench_anytree(rng_, params_, work_dir_):
+    from anytree.importer import DictImporter
+    from anytree.search import findall
+    data = textbooks(rng_, params_)
+
+    def run():
+        trees = []
+        for row, tb in data:
+            root = DictImporter().import_(tb)
+            findall(root, filter_=lambda node: getattr(node, 'dialcodes', None) and node.leafNodesCount > 0)
+            findall(root, filter_=lambda node: node.is_leaf)
+            [node.path for node in (root,) + root.descendants]
+            trees.append(root)
+        return trees
+    return run
+
+
+def bench_compact_tree(rng_, params_, work_dir_):
+    data = textbooks(rng_, params_)
+
+    def run():
+        trees = []
+        for row, tb in data:
+            tree = CompactTree.build(tb, lambda node: node.get('children') or [],
+                                     dialcode=lambda node: node['dialcodes'][0] if 'dialcodes' in node else '',
+                                     leafNodesCount=lambda node: node.get('leafNodesCount', 0))
+            tree.count((tree['dialcode'] != '') & (tree['leafNodesCount'] > 0))
+            tree.count(tree.is_leaf)
+            tree.paths()
+            trees.append(tree)
+        return trees
+    return run
+
+
+def bench_daily_metrics(rng_, params_, work_dir_):
+    from dataproducts.services.consumption.consumption_metrics import DailyMetrics
+    date = benchmark_date.strftime('%Y-%m-%d')
+    tenants = generators.channels(params_['channels'])
+    for folder in ['textbook_reports', 'dialcode_scans', 'downloads', 'play']:
+        work_dir_.joinpath(folder, date).mkdir(parents=True, exist_ok=True)
+    work_dir_.joinpath('portal_dashboards').mkdir(exist_ok=True)
+    pd.DataFrame(tenants).to_csv(work_dir_.joinpath('textbook_reports', date, 'tenant_info.csv'), index=False)
+    # the unmapped channel sorts first, daily_metrics reads the unmapped scans from the first row
+    scans = [{'dialcode_channel': channel, 'failed_flag': flag, 'count': rng_.randint(0, 10 ** 5)}
+             for channel in [''] + [tenant['id'] for tenant in tenants]
+             for flag in ['Failed QR Scans', 'Successful QR Scans']]
+    pd.DataFrame(scans).to_csv(work_dir_.joinpath('dialcode_scans', date, 'dial_scans.csv'), index=False)
+    pd.DataFrame([{'channel': tenant['id'], 'count': rng_.randint(0, 10 ** 5)} for tenant in tenants]).to_csv(
+        work_dir_.joinpath('downloads', date, 'downloads.csv'), index=False)
+    pd.DataFrame([{'Total App Sessions': rng_.randint(10 ** 5, 10 ** 6), 'Total Devices on App': rng_.randint(10 ** 4, 10 ** 5),
+                   'Total Time on App (in hours)': rng_.random() * 10 ** 5}]).to_csv(
+        work_dir_.joinpath('play', date, 'app_sessions.csv'), index=False)
+    plays = pd.DataFrame([{'channel': tenant['id'], 'pdata_id': pdata_id,
+                           'Total Devices that played content': rng_.randint(0, 10 ** 4),
+                           'Total Content Plays': rng_.randint(0, 10 ** 5),
+                           'Content Play Time (in hours)': rng_.random() * 10 ** 4}
+                          for tenant in tenants for pdata_id in [generators.app_pdata, generators.portal_pdata]])
+    plays.pivot(index='channel', columns='pdata_id').to_csv(work_dir_.joinpath('play', date, 'plays.csv'))
+    daily_metrics = DailyMetrics(work_dir_, None, None, None, None, benchmark_date.strftime('%d/%m/%Y'))
+    daily_metrics.config = {'context': {'pdata': {'id': {'app': generators.app_pdata, 'portal': generators.portal_pdata}}}}
+
+    def run():
+        daily_metrics.daily_metrics(read_loc_=work_dir_, date_=benchmark_date)
+    return run
+
+
+def bench_gen_aggregated_report(rng_, params_, work_dir_):
+    from dataproducts.services.etb.content_progress import ContentProgress
+    result_loc = work_dir_.joinpath('content_progress', 'tenant0000')
+    result_loc.mkdir(parents=True, exist_ok=True)
+    work_dir_.joinpath('portal_dashboards', 'tenant0000').mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(generators.content_search_rows(rng_, params_['contents'], 'channel0000')).to_csv(
+        result_loc.joinpath('data.csv'), index=False, encoding='utf-8')
+    content_progress = ContentProgress(work_dir_, None, benchmark_date.strftime('%d/%m/%Y'), None)
+
+    def run():
+        content_progress.gen_aggregated_report(result_loc_=result_loc)
+    return run
+
+
+def bench_create_json(rng_, params_, work_dir_):
+    path = work_dir_.joinpath('create_json.csv')
+    pd.DataFrame(generators.content_search_rows(rng_, params_['rows'], 'channel0000')).to_csv(path, index=False)
+
+    def run():
+        create_json(path)
+    return run
+
+
+cases = {
+    'parse_tb': bench_parse_tb,
+    'etb_tree': bench_etb_tree,
+    'anytree': bench_anytree,
+    'compact_tree': bench_compact_tree,
+    'daily_metrics': bench_daily_metrics,
+    'gen_aggregated_report': bench_gen_aggregated_report,
+    'create_json': bench_create_json
+}
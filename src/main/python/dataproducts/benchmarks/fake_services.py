@@ -0,0 +1,393 @@
+"""
+Local stand-ins for the HTTP services the jobs call: druid/v2, v3/search, the content hierarchy, v1/org/search and
+Prometheus query_range. Responses are recorded JSON files when a record folder has them and seeded synthetic data
+otherwise. Latency, error rate and a request rate limit can be injected to load test whole jobs on one machine.
+usage: python -m dataproducts.benchmarks.fake_services --port 8099 [--latency_ms 50] [--error_rate 0.01]
+       [--max_rps 200] [--record_dir recorded_responses]
+and point the job at http://localhost:8099/ for its druid, content search, hierarchy and org search hosts
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import socketserver
+
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+from dataproducts.benchmarks import generators
+
+routes = [
+    ('druid', re.compile(r'/druid/v2/?$')),
+    ('search', re.compile(r'/v3/search$')),
+    ('hierarchy', re.compile(r'/hierarchy/(?P<identifier>[^/?]+)$')),
+    ('org_search', re.compile(r'/v1/org/search$')),
+    ('query_range', re.compile(r'/api/v1/query_range$'))
+]
+
+district_names = ['District {}'.format(i) for i in range(1, 41)]
+state_names = ['State {}'.format(i) for i in range(1, 11)]
+
+
+class FaultInjector:
+    """
+    latency, error and request rate faults shared by all the handler threads
+    """
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, max_rps=None, seed=42):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def throttle(self):
+        """
+        wait for the next free request slot when a request rate limit is set
+        :return: None
+        """
+        if not self.max_rps:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + 1.0 / self.max_rps
+        if slot > now:
+            time.sleep(slot - now)
+
+    def delay(self):
+        with self.lock:
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+
+class SyntheticData:
+    """
+    seeded responses consistent across the services: org search returns the channels the textbooks are created for and
+    the hierarchy of a textbook is the same on every request
+    """
+    def __init__(self, seed=42, textbooks=100, resources=1000, channels=20, depth=3, fan_out=4, druid_rows=1000,
+                 date=None, search_window=10000):
+        self.seed = seed
+        self.search_window = search_window
+        self.depth = depth
+        self.fan_out = fan_out
+        self.druid_rows = druid_rows
+        self.date = date or datetime(2020, 1, 1)
+        rng = random.Random(seed)
+        self.channels = generators.channels(channels)
+        self.textbooks = [generators.textbook_row(rng, self.channels[i % channels]['id'], self.date)
+                          for i in range(textbooks)]
+        for row in self.textbooks:
+            row.pop('grade')
+        self.textbook_index = {row['identifier']: row for row in self.textbooks}
+        self.resources = []
+        for i in range(resources):
+            row = generators.content_search_rows(rng, 1, self.channels[i % channels]['id'], 0)[0]
+            row.update({'contentType': 'Resource', 'gradeLevel': row.pop('grade').split(', '),
+                        'createdFor': [row['channel']], 'mimeType': rng.choice(generators.mime_types),
+                        'name': 'Resource {}'.format(i),
+                        'createdOn': self.textbooks[i % len(self.textbooks)]['createdOn'] if self.textbooks else None,
+                        'lastUpdatedOn': self.date.strftime('%Y-%m-%dT%H:%M:%S.000+0000')})
+            row.pop('content format')
+            self.resources.append(row)
+        self.dimension_values = {
+            'channel': [channel['id'] for channel in self.channels],
+            'pdata': [generators.app_pdata, generators.portal_pdata],
+            'dialcode': [generators.dialcode(rng) for _ in range(500)],
+            'rollup': list(self.textbook_index.keys()) or ['do_0'],
+            'object_id': [row['identifier'] for row in self.resources] or ['do_0'],
+            'content_id': [row['identifier'] for row in self.resources] or ['do_0'],
+            'district': district_names,
+            'state': state_names
+        }
+
+    def org_search(self, request_):
+        content = [{'id': channel['id'], 'channel': channel['id'], 'slug': channel['slug'],
+                    'orgName': 'Organisation {}'.format(channel['slug'])} for channel in self.channels]
+        return {'id': 'api.org.search', 'responseCode': 'OK', 'result': {'response': {'count': len(content),
+                                                                                      'content': content}}}
+
+    def search(self, request_):
+        """
+        v3/search filtered on contentType, status, channel, createdFor and a createdOn range, with sort_by, limit, offset and fields.
+        pages past the search window are refused like elasticsearch does
+        :param request_: parsed request body
+        :return: response dictionary
+        """
+        request = request_.get('request', {})
+        filters = request.get('filters', {})
+        content_types = filters.get('contentType', [])
+        content_types = content_types if isinstance(content_types, list) else [content_types]
+        if content_types and all(content_type.lower() == 'textbook' for content_type in content_types):
+            content = self.textbooks
+        else:
+            content = self.resources
+        for field in ['status', 'channel', 'createdFor']:
+            values = filters.get(field)
+            if values:
+                values = values if isinstance(values, list) else [values]
+                content = [row for row in content if set(values).intersection(
+                    row.get(field) if isinstance(row.get(field), list) else [row.get(field)])]
+        created_on = filters.get('createdOn')
+        if isinstance(created_on, dict):
+            content = [row for row in content if created_on.get('>=', '') <= row['createdOn'] and
+                       ('<' not in created_on or row['createdOn'] < created_on['<'])]
+        # stable sorts from the last key to the first, so the first key is the primary order
+        for field, order in reversed(list((request.get('sort_by') or {}).items())):
+            content = sorted(content, key=lambda row: row.get(field) or '', reverse=order == 'desc')
+        offset = int(request.get('offset', 0))
+        limit = int(request.get('limit', 100))
+        if offset + limit > self.search_window:
+            return {'id': 'api.v3.search', 'responseCode': 'CLIENT_ERROR',
+                    'result': {'messages': ['Result window is too large']}}
+        page = content[offset:offset + limit]
+        fields = request.get('fields')
+        if fields:
+            page = [{key: row[key] for key in fields + ['identifier'] if key in row} for row in page]
+        return {'id': 'api.v3.search', 'responseCode': 'OK', 'result': {'count': len(content), 'content': page}}
+
+    def hierarchy(self, identifier_):
+        row = self.textbook_index.get(identifier_)
+        if row is None:
+            return {'id': 'api.content.hierarchy.get', 'responseCode': 'RESOURCE_NOT_FOUND', 'result': {}}
+        rng = random.Random('{}:{}'.format(self.seed, identifier_))
+        tb = generators.textbook_hierarchy(rng, row, depth_=self.depth, fan_out_=self.fan_out)
+        tb.update({key: row[key] for key in ['channel', 'board', 'medium', 'gradeLevel', 'subject', 'status']})
+        return {'id': 'api.content.hierarchy.get', 'responseCode': 'OK', 'result': {'content': tb}}
+
+    def dimension_domain(self, name_):
+        for key, values in self.dimension_values.items():
+            if key in name_:
+                return values
+        return ['{}_{}'.format(name_, i) for i in range(10)]
+
+    def druid(self, query_):
+        """
+        druid response for the query type with rows over the query dimensions and aggregations
+        :param query_: parsed druid query
+        :return: response list
+        """
+        rng = random.Random('{}:{}'.format(self.seed, json.dumps(query_, sort_keys=True)))
+        dimensions = []
+        for dimension in query_.get('dimensions', []) + ([query_['dimension']] if 'dimension' in query_ else []):
+            if isinstance(dimension, dict):
+                dimensions.append((dimension.get('outputName') or dimension['dimension'], dimension['dimension']))
+            else:
+                dimensions.append((dimension, dimension))
+        metrics = [aggregation['name'] for aggregation in
+                   query_.get('aggregations', []) + query_.get('postAggregations', [])]
+        metrics += [metric for metric in query_.get('metrics', []) if isinstance(metric, str)]
+        domains = {name: self.dimension_domain(source) for name, source in dimensions}
+        query_type = query_.get('queryType', 'groupBy')
+        if query_type == 'select':
+            if query_.get('pagingSpec', {}).get('pagingIdentifiers'):
+                return [{'timestamp': self.date.strftime('%Y-%m-%dT00:00:00.000Z'),
+                         'result': {'pagingIdentifiers': {}, 'events': []}}]
+            return generators.druid_select(rng, self.druid_rows, domains, metrics, self.date)
+        rows = generators.druid_group_by(rng, self.druid_rows, domains, metrics, self.date)
+        if query_type == 'topN':
+            return [{'timestamp': rows[0]['timestamp'] if rows else None,
+                     'result': [row['event'] for row in rows[:int(query_.get('threshold', 1000))]]}]
+        if query_type == 'timeseries':
+            return [{'timestamp': row['timestamp'], 'result': {name: row['event'][name] for name in metrics}}
+                    for row in rows[:1]]
+        return rows
+
+    def query_range(self, params_):
+        start = int(float(params_.get('start', [0])[0]))
+        end = int(float(params_.get('end', [start])[0]))
+        step = max(int(float(params_.get('step', [900])[0])), 1)
+        rng = random.Random('{}:{}'.format(self.seed, start))
+        values = [[timestamp, str(rng.uniform(1000, 5000))] for timestamp in range(start, end + 1, step)]
+        return {'status': 'success', 'data': {'resultType': 'matrix', 'result': [{'metric': {}, 'values': values}]}}
+
+
+class RecordedData:
+    """
+    responses saved under a folder as <route>.json or <route>/<identifier>.json for the hierarchy
+    """
+    def __init__(self, record_dir):
+        self.record_dir = Path(record_dir)
+
+    def get(self, route_, identifier_=None):
+        paths = [self.record_dir.joinpath(route_, '{}.json'.format(identifier_))] if identifier_ else []
+        paths.append(self.record_dir.joinpath('{}.json'.format(route_)))
+        for path in paths:
+            if path.exists():
+                with open(path, 'r') as f:
+                    return json.load(f)
+        return None
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status_, body_):
+        data = json.dumps(body_).encode('utf-8')
+        self.send_response(status_)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = self.rfile.read(length)
+        try:
+            return json.loads(body.decode('utf-8'))
+        except ValueError:
+            return {}
+
+    def handle_request(self):
+        server = self.server
+        url = urlparse(self.path)
+        body = self.read_body()
+        for name, pattern in routes:
+            match = pattern.search(url.path)
+            if match:
+                break
+        else:
+            server.count('unknown', 404)
+            self.send_json(404, {'responseCode': 'NOT_FOUND', 'result': {}})
+            return
+        server.faults.throttle()
+        server.faults.delay()
+        if server.faults.should_fail():
+            server.count(name, 500)
+            self.send_json(500, {'responseCode': 'SERVER_ERROR', 'result': {}})
+            return
+        identifier = match.groupdict().get('identifier')
+        response = server.recorded.get(name, identifier) if server.recorded else None
+        if response is None:
+            if name == 'druid':
+                response = server.data.druid(body)
+            elif name == 'search':
+                response = server.data.search(body)
+            elif name == 'hierarchy':
+                response = server.data.hierarchy(identifier)
+            elif name == 'org_search':
+                response = server.data.org_search(body)
+            else:
+                response = server.data.query_range(parse_qs(url.query))
+        status = 400 if response.get('responseCode') == 'CLIENT_ERROR' else 200
+        server.count(name, status)
+        self.send_json(status, response)
+
+    do_GET = handle_request
+    do_POST = handle_request
+
+
+class FakeServiceServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address_, data_, faults_, recorded_=None):
+        super().__init__(address_, FakeServiceHandler)
+        self.data = data_
+        self.faults = faults_
+        self.recorded = recorded_
+        self.counts = Counter()
+        self.counts_lock = threading.Lock()
+
+    def count(self, route_, status_):
+        with self.counts_lock:
+            self.counts[(route_, status_)] += 1
+
+
+class FakeServices:
+    """
+    run the stand-in services on a localhost port in a background thread
+    usage:
+        with FakeServices(latency_ms=20, error_rate=0.01) as services:
+            ETBMetrics(..., org_search=services.url, druid_hostname=services.url, ...).init()
+    """
+    def __init__(self, port=0, seed=42, latency_ms=0, jitter_ms=0, error_rate=0.0, max_rps=None, record_dir=None,
+                 **data_params):
+        self.server = FakeServiceServer(('127.0.0.1', port), SyntheticData(seed=seed, **data_params),
+                                        FaultInjector(latency_ms, jitter_ms, error_rate, max_rps, seed),
+                                        RecordedData(record_dir) if record_dir else None)
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self.server.server_address)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def stats(self):
+        """
+        requests served by route and status
+        :return: dictionary of route to dictionary of status to count
+        """
+        stats = {}
+        with self.server.counts_lock:
+            for (route, status), count in self.server.counts.items():
+                stats.setdefault(route, {})[status] = count
+        return stats
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='dataproducts.benchmarks.fake_services')
+    parser.add_argument("--port", type=int, default=8099, help="localhost port to listen on")
+    parser.add_argument("--seed", type=int, default=42, help="seed for the synthetic responses")
+    parser.add_argument("--latency_ms", type=float, default=0, help="latency added to every response")
+    parser.add_argument("--jitter_ms", type=float, default=0, help="random latency added on top of latency_ms")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--max_rps", type=float, help="requests per second served across all routes")
+    parser.add_argument("--record_dir", type=str, help="folder of recorded responses to serve before synthetic ones")
+    parser.add_argument("--textbooks", type=int, default=100, help="textbooks returned by v3/search")
+    parser.add_argument("--resources", type=int, default=1000, help="resources returned by v3/search")
+    parser.add_argument("--channels", type=int, default=20, help="tenants returned by org search")
+    parser.add_argument("--depth", type=int, default=3, help="unit levels of the textbook hierarchies")
+    parser.add_argument("--fan_out", type=int, default=4, help="maximum children of a textbook unit")
+    parser.add_argument("--druid_rows", type=int, default=1000, help="rows in each druid response")
+    args = parser.parse_args()
+
+    services = FakeServices(args.port, args.seed, args.latency_ms, args.jitter_ms, args.error_rate, args.max_rps,
+                            args.record_dir, textbooks=args.textbooks, resources=args.resources,
+                            channels=args.channels, depth=args.depth, fan_out=args.fan_out,
+                            druid_rows=args.druid_rows)
+    print('Serving on {}'.format(services.url))
+    try:
+        services.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        services.server.server_close()
+        print(json.dumps(services.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Seeded generators of synthetic inputs shaped like the production APIs and stores.
+"""
+import json
+import string
+import itertools
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+boards = ['CBSE', 'State (Andhra Pradesh)', 'State (Karnataka)', 'State (Maharashtra)', 'State (Tamil Nadu)']
+mediums = ['English', 'Hindi', 'Kannada', 'Marathi', 'Tamil', 'Telugu']
+subjects = ['Mathematics', 'Science', 'English', 'Hindi', 'Social Science', 'Environmental Studies']
+grades = ['KG'] + ['Class {}'.format(i) for i in range(1, 13)] + ['Other']
+statuses = ['Live', 'Review', 'Draft']
+resource_types = ['Learn', 'Practice', 'Teach', 'Experiment']
+mime_types = ['video/x-youtube', 'application/vnd.ekstep.ecml-archive', 'video/mp4', 'video/webm', 'application/pdf',
+              'application/epub', 'application/vnd.ekstep.html-archive', 'application/vnd.ekstep.h5p-archive']
+content_formats = ['YouTube Content', 'Created on Diksha', 'Uploaded Videos', 'Text Content',
+                   'Uploaded Interactive Content']
+app_pdata = 'prod.diksha.app'
+portal_pdata = 'prod.diksha.portal'
+
+ContentAggregate = namedtuple('ContentAggregate', ['content_id', 'period', 'pdata_id', 'metric'])
+
+
+def identifier(rng_, prefix_='do_'):
+    return prefix_ + ''.join(rng_.choice(string.digits) for _ in range(22))
+
+
+def dialcode(rng_):
+    return ''.join(rng_.choice(string.ascii_uppercase + string.digits) for _ in range(6))
+
+
+def channels(count_):
+    """
+    channel ids and slugs, in the layout of tenant_info.csv
+    :param count_: number of channels
+    :return: list of dictionaries with id and slug
+    """
+    return [{'id': 'channel{:04d}'.format(i), 'slug': 'tenant{:04d}'.format(i)} for i in range(count_)]
+
+
+def textbook_row(rng_, channel_, date_=None):
+    """
+    textbook metadata as returned by v3/search and prepared by ETBMetrics.generate_reports
+    :param rng_: random.Random
+    :param channel_: channel id
+    :param date_: datetime the textbook was last updated on
+    :return: dictionary
+    """
+    date_ = date_ or datetime(2020, 1, 1)
+    grade_level = sorted(rng_.sample(grades[1:13], rng_.randint(1, 2)), key=grades.index)
+    created_on = date_ - timedelta(days=rng_.randint(30, 700))
+    return {
+        'identifier': identifier(rng_),
+        'createdFor': [channel_],
+        'createdOn': created_on.strftime('%Y-%m-%dT%H:%M:%S.000+0000'),
+        'lastUpdatedOn': date_.strftime('%Y-%m-%dT%H:%M:%S.000+0000'),
+        'board': rng_.choice(boards),
+        'medium': rng_.choice(mediums),
+        'gradeLevel': grade_level,
+        'subject': rng_.choice(subjects),
+        'name': 'Textbook {}'.format(rng_.randint(1, 10 ** 6)),
+        'status': rng_.choice(statuses),
+        'channel': channel_,
+        'grade': ', '.join(grade_level)
+    }
+
+
+def textbook_hierarchy(rng_, row_, depth_=3, fan_out_=4, dialcode_ratio_=0.5, contents_per_leaf_=3):
+    """
+    textbook hierarchy as returned by learning-service/content/v3/hierarchy. units have 1 to fan_out_ children up
+    to depth_ levels, leaf units have 0 to contents_per_leaf_ resources.
+    :param rng_: random.Random
+    :param row_: textbook metadata from textbook_row
+    :param depth_: number of unit levels below the textbook
+    :param fan_out_: maximum children of a unit
+    :param dialcode_ratio_: fraction of units linked to a QR code
+    :param contents_per_leaf_: maximum resources in a leaf unit
+    :return: dictionary
+    """
+    counter = itertools.count(1)
+
+    def resource():
+        return {'identifier': identifier(rng_), 'name': 'Resource {}'.format(next(counter)), 'contentType': 'Resource',
+                'mimeType': rng_.choice(mime_types)}
+
+    def unit(level_):
+        node = {'identifier': identifier(rng_), 'name': 'Unit {}'.format(next(counter)),
+                'contentType': 'TextBookUnit'}
+        if rng_.random() < dialcode_ratio_:
+            node['dialcodes'] = [dialcode(rng_)]
+        if level_ < depth_:
+            node['children'] = [unit(level_ + 1) for _ in range(rng_.randint(1, fan_out_))]
+        else:
+            node['children'] = [resource() for _ in range(rng_.randint(0, contents_per_leaf_))]
+        node['leafNodesCount'] = sum(child.get('leafNodesCount', 1) for child in node['children'])
+        return node
+
+    children = [unit(1) for _ in range(rng_.randint(1, fan_out_))]
+    root = {'identifier': row_['identifier'], 'name': row_['name'], 'contentType': 'TextBook', 'children': children,
+            'leafNodesCount': sum(child['leafNodesCount'] for child in children)}
+    if rng_.random() < dialcode_ratio_:
+        root['dialcodes'] = [dialcode(rng_)]
+    return root
+
+
+def druid_group_by(rng_, rows_, dimensions_, metrics_, date_=None):
+    """
+    druid groupBy response
+    :param rng_: random.Random
+    :param rows_: number of rows
+    :param dimensions_: dictionary of dimension name to list of values
+    :param metrics_: list of metric names
+    :param date_: datetime of the rows
+    :return: list of dictionaries
+    """
+    timestamp = (date_ or datetime(2020, 1, 1)).strftime('%Y-%m-%dT00:00:00.000Z')
+    response = []
+    for _ in range(rows_):
+        event = {name: rng_.choice(values) for name, values in dimensions_.items()}
+        event.update({name: rng_.randint(1, 5000) for name in metrics_})
+        response.append({'version': 'v1', 'timestamp': timestamp, 'event': event})
+    return response
+
+
+def druid_select(rng_, rows_, dimensions_, metrics_, date_=None):
+    """
+    druid select response, one page with all the rows
+    :param rng_: random.Random
+    :param rows_: number of rows
+    :param dimensions_: dictionary of dimension name to list of values
+    :param metrics_: list of metric names
+    :param date_: datetime of the rows
+    :return: list with one result dictionary
+    """
+    timestamp = (date_ or datetime(2020, 1, 1)).strftime('%Y-%m-%dT00:00:00.000Z')
+    events = [{'segmentId': 'benchmark_segment', 'offset': offset, 'event': row['event']}
+              for offset, row in enumerate(druid_group_by(rng_, rows_, dimensions_, metrics_, date_))]
+    return [{'timestamp': timestamp,
+             'result': {'pagingIdentifiers': {'benchmark_segment': rows_ - 1}, 'events': events}}]
+
+
+def content_aggregates(rng_, contents_, date_=None, days_=7):
+    """
+    rows of the cassandra content_aggregates table for the week before date_
+    :param rng_: random.Random
+    :param contents_: number of content ids
+    :param date_: datetime the week ends on
+    :param days_: number of days
+    :return: list of ContentAggregate
+    """
+    date_ = date_ or datetime(2020, 1, 8)
+    rows = []
+    for _ in range(contents_):
+        content_id = identifier(rng_)
+        for day in range(1, days_ + 1):
+            period = int((date_ - timedelta(days=day)).strftime('%Y%m%d'))
+            for pdata_id in [app_pdata, portal_pdata]:
+                rows.append(ContentAggregate(content_id, period, pdata_id,
+                                             {'plays': rng_.randint(0, 500), 'timespent': rng_.randint(0, 50000)}))
+    return rows
+
+
+def telemetry_events(rng_, count_, eids_=('IMPRESSION', 'INTERACT', 'START', 'END', 'SEARCH', 'LOG'), date_=None):
+    """
+    raw telemetry events
+    :param rng_: random.Random
+    :param count_: number of events
+    :param eids_: event types to pick from
+    :param date_: datetime of the events
+    :return: list of json strings
+    """
+    start = int((date_ or datetime(2020, 1, 1)).timestamp() * 1000)
+    events = []
+    for _ in range(count_):
+        eid = rng_.choice(eids_)
+        event = {
+            'eid': eid, 'ets': start + rng_.randint(0, 86399999), 'ver': '3.0', 'mid': '{}:{}'.format(eid, identifier(rng_, '')),
+            'actor': {'id': identifier(rng_, ''), 'type': 'User'},
+            'context': {'channel': 'channel{:04d}'.format(rng_.randint(0, 30)), 'env': rng_.choice(['home', 'library', 'qr']),
+                        'sid': identifier(rng_, ''), 'did': identifier(rng_, ''),
+                        'pdata': {'id': rng_.choice([app_pdata, portal_pdata]), 'ver': '2.7.0', 'pid': 'sunbird.app'}},
+            'object': {'id': identifier(rng_), 'type': 'Content', 'rollup': {'l1': identifier(rng_)}},
+            'edata': {'type': 'view', 'pageid': 'content-detail'}
+        }
+        if eid == 'SEARCH':
+            event['edata'] = {'type': 'content', 'size': rng_.randint(0, 50), 'filters': {'dialcodes': dialcode(rng_)}}
+        events.append(json.dumps(event))
+    return events
+
+
+def content_search_rows(rng_, count_, channel_, missing_ratio_=0.05):
+    """
+    resources of a channel, in the layout ContentProgress.get_content_data writes to data.csv
+    :param rng_: random.Random
+    :param count_: number of resources
+    :param channel_: channel id
+    :param missing_ratio_: fraction of rows with a missing board, medium, grade or subject
+    :return: list of dictionaries
+    """
+    rows = []
+    for _ in range(count_):
+        grade_level = sorted(rng_.sample(grades, rng_.randint(1, 3)), key=grades.index)
+        row = {'channel': channel_, 'identifier': identifier(rng_), 'board': rng_.choice(boards),
+               'medium': rng_.choice(mediums), 'grade': ', '.join(grade_level), 'subject': rng_.choice(subjects),
+               'resourceType': rng_.choice(resource_types), 'status': rng_.choice(statuses + ['Unlisted']),
+               'content format': rng_.choice(content_formats)}
+        if rng_.random() < missing_ratio_:
+            row[rng_.choice(['board', 'medium', 'grade', 'subject'])] = None
+        rows.append(row)
+    return rows
@@ -0,0 +1,123 @@
+"""
+Run the benchmark cases and store the timings as JSON, optionally comparing with an earlier run.
+usage: python -m dataproducts.benchmarks.runner --output benchmark_results [--cases ...] [--scales ...]
+       [--compare benchmark_results/<earlier run>.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+
+from datetime import datetime
+from pathlib import Path
+
+from dataproducts.benchmarks.cases import cases, scales
+
+
+def get_version():
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution('dataproducts').version
+    except Exception:
+        return 'dev'
+
+
+def run_case(name_, scale_, seed_, repeat_, work_dir_):
+    """
+    prepare a case once, time repeat_ runs of it and trace the memory of one more run
+    :param name_: case name
+    :param scale_: scale name
+    :param seed_: random seed for the input generators
+    :param repeat_: number of timed runs
+    :param work_dir_: pathlib.Path folder for the case input and output
+    :return: result dictionary
+    """
+    work_dir_.mkdir(parents=True, exist_ok=True)
+    run = cases[name_](random.Random(seed_), scales[scale_], work_dir_)
+    timings = []
+    for _ in range(repeat_):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'case': name_,
+        'scale': scale_,
+        'params': scales[scale_],
+        'timings': timings,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'peak_memory_mb': peak / 1048576.0
+    }
+
+
+def compare(results_, previous_path_):
+    """
+    print the median of each case against an earlier run
+    :param results_: results of this run
+    :param previous_path_: path to the JSON of an earlier run
+    :return: None
+    """
+    with open(previous_path_, 'r') as f:
+        previous = {(result['case'], result['scale']): result for result in json.load(f)['results']}
+    for result in results_:
+        before = previous.get((result['case'], result['scale']))
+        if before:
+            print('{} [{}]: {:.4f}s -> {:.4f}s ({:.2f}x)'.format(result['case'], result['scale'], before['median'],
+                                                                result['median'], before['median'] / result['median']))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='dataproducts.benchmarks')
+    parser.add_argument("--cases", nargs='+', choices=sorted(cases.keys()), default=sorted(cases.keys()),
+                        help="cases to run")
+    parser.add_argument("--scales", nargs='+', choices=list(scales.keys()), default=['small', 'medium'],
+                        help="input scales to run each case at")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case and scale")
+    parser.add_argument("--seed", type=int, default=42, help="seed for the input generators")
+    parser.add_argument("--label", type=str, default=get_version(), help="label of this run, eg: version or branch")
+    parser.add_argument("--output", type=str, default='benchmark_results', help="folder to write the results JSON to")
+    parser.add_argument("--compare", type=str, help="results JSON of an earlier run to compare with")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix='dataproducts_benchmarks_'))
+    # report uploads go to a local folder instead of blob storage
+    os.environ['STORAGE_BACKEND'] = 'file'
+    os.environ['LOCAL_STORAGE_PATH'] = str(work_dir.joinpath('storage'))
+    results = []
+    for name in args.cases:
+        for scale in args.scales:
+            result = run_case(name, scale, args.seed, args.repeat, work_dir.joinpath(name, scale))
+            print('{} [{}]: min={:.4f}s median={:.4f}s peak memory={:.2f}MB'.format(
+                name, scale, result['min'], result['median'], result['peak_memory_mb']))
+            results.append(result)
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    output_path = output.joinpath('{}_{}.json'.format(args.label, datetime.now().strftime('%Y%m%d%H%M%S')))
+    with open(output_path, 'w') as f:
+        json.dump({
+            'label': args.label,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'results': results
+        }, f, indent=2)
+    print('Results: {}'.format(output_path))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,8 +15,9 @@ from pathlib import Path
 from pyspark.sql import SparkSession
 from pyspark.sql import functions as func
 
+from dataproducts.util.span_utils import timed
 from dataproducts.util.utils import create_json, post_data_to_blob, get_data_from_blob, \
-    get_tenant_info, get_textbook_snapshot, push_metric_event
+    get_tenant_info, get_textbook_snapshot, push_metric_event, write_report, write_partitions
 from dataproducts.resources.queries import dialcode_scans, content_downloads, \
     app_sessions_devices, app_plays
 
@@ -57,6 +58,7 @@ class DailyMetrics:
 
 
     # TODO: Compute Downloads using SHARE-In events
+    @timed()
     def downloads(self, result_loc_, date_):
         """
         Compute daily content downloads by channel
@@ -92,6 +94,7 @@ class DailyMetrics:
         post_data_to_blob(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'downloads.csv'), backup=True)
 
 
+    @timed()
     def app_and_plays(self, result_loc_, date_):
         """
         Compute App Sessions and content play sessions and time spent on content consumption.
@@ -152,6 +155,7 @@ class DailyMetrics:
         post_data_to_blob(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'plays.csv'), backup=True)
 
 
+    @timed()
     def dialscans(self, result_loc_, date_):
         """
         compute failed/successful scans by channel
@@ -183,6 +187,7 @@ class DailyMetrics:
         df.to_csv(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'dial_scans.csv'), index=False)
         post_data_to_blob(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'dial_scans.csv'), backup=True)
 
+    @timed()
     def daily_metrics(self, read_loc_, date_):
         """
         merge the three metrics
@@ -347,8 +352,11 @@ class DailyMetrics:
                                                  'Content Play Time on Portal (in hours)',
                                                  'Total Content Plays', 'Total Devices that played content',
                                                  'Total Content Play Time (in hours)']]
-            for slug, value in daily_metrics_df.iterrows():
-                if slug != '':
+
+            def write_slug(slug_, slug_metrics):
+                if slug_ == '':
+                    return None
+                for slug, value in slug_metrics.iterrows():
                     read_loc_.joinpath('portal_dashboards', slug).mkdir(exist_ok=True)
                     for key, val in value.items():
                         if key not in ['Date', 'Percentage (%) of Failed QR Scans']:
@@ -373,9 +381,10 @@ class DailyMetrics:
                                            'Total Devices that played content on Portal',
                                            'Content Play Time on Portal (in hours)', 'Total Content Plays',
                                            'Total Devices that played content', 'Total Content Play Time (in hours)']]
-                    blob_data.to_csv(read_loc_.joinpath('portal_dashboards', slug, 'daily_metrics.csv'), index=False)
-                    create_json(read_loc_.joinpath('portal_dashboards', slug, 'daily_metrics.csv'))
-                    post_data_to_blob(read_loc_.joinpath('portal_dashboards', slug, 'daily_metrics.csv'))
+                    write_report(blob_data, read_loc_.joinpath('portal_dashboards', slug, 'daily_metrics.csv'))
+                return [read_loc_.joinpath('portal_dashboards', slug_, 'daily_metrics.csv')]
+
+            write_partitions(daily_metrics_df, 'slug', write_slug)
         except Exception:
             raise Exception('State Metrics Error!')
 
@@ -19,6 +19,8 @@ sys.path.append(util_path)
 
 from utils import create_json, post_data_to_blob, get_data_from_blob, \
     get_tenant_info, get_textbook_snapshot, push_metric_event
+from telemetry_utils import read_telemetry
+from storage_utils import configure_spark_storage
 
 findspark.init()
 
@@ -32,26 +34,22 @@ def downloads(result_loc_, date_):
     :return: None
     """
     spark = SparkSession.builder.appName("content_downloads").master("local[*]").getOrCreate()
-    account_name = os.environ['AZURE_STORAGE_ACCOUNT']
-    account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
-    container = 'telemetry-data-store'
-    spark.conf.set('fs.azure.account.key.{}.blob.core.windows.net'.format(account_name), account_key)
-    path = 'wasbs://{}@{}.blob.core.windows.net/telemetry-denormalized/raw/{}-*'.format(container, account_name,
-                                                                                        date_.strftime('%Y-%m-%d'))
-    data = spark.read.json(path).filter(
+    configure_spark_storage(spark)
+    data = read_telemetry(spark, 'raw', date_, pdata_ids_=[config['context']['pdata']['id']['app'],
+                                                           config['context']['pdata']['id']['desktop']]).filter(
         (
-            func.col("context.pdata.id").isin(config['context']['pdata']['id']['app']) &
-            func.col("edata.subtype").isin("ContentDownload-Success") &
+            func.col("pdata_id").isin(config['context']['pdata']['id']['app']) &
+            func.col("edata_subtype").isin("ContentDownload-Success") &
             func.col("eid").isin("INTERACT")
         ) | (
-            func.col("context.pdata.id").isin(config['context']['pdata']['id']['desktop']) &
-            func.col("edata.state").isin("COMPLETED") &
-            func.col("context.env").isin("downloadManager")
+            func.col("pdata_id").isin(config['context']['pdata']['id']['desktop']) &
+            func.col("edata_state").isin("COMPLETED") &
+            func.col("context_env").isin("downloadManager")
         )
     ).select(
-        func.col("context.pdata.id").alias("pdata_id"),
-        func.col("object.id").alias("object_id"),
-        "context.did"
+        func.col("pdata_id"),
+        func.col("object_id"),
+        func.col("context_did").alias("did")
     )
     content = spark.read.csv(
         str(result_loc_.parent.joinpath('tb_metadata', date_.strftime('%Y-%m-%d'), 'textbook_snapshot.csv')),
@@ -86,26 +84,20 @@ def app_and_plays(result_loc_, date_):
     :return: None
     """
     spark = SparkSession.builder.appName("content_plays").master("local[*]").getOrCreate()
-    account_name = os.environ['AZURE_STORAGE_ACCOUNT']
-    account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
-    container = 'telemetry-data-store'
-    spark.conf.set('fs.azure.account.key.{}.blob.core.windows.net'.format(account_name), account_key)
-    path = 'wasbs://{}@{}.blob.core.windows.net/telemetry-denormalized/summary/{}-*'.format(container, account_name,
-                                                                                            date_.strftime('%Y-%m-%d'))
-    data = spark.read.json(path).filter(
-        func.col("dimensions.pdata.id").isin(config['context']['pdata']['id']['app'],
-                                             config['context']['pdata']['id']['portal'],
-                                             config['context']['pdata']['id']['desktop']) &
-        func.col("dimensions.type").isin("content", "app")
+    configure_spark_storage(spark)
+    data = read_telemetry(spark, 'summary', date_, pdata_ids_=[config['context']['pdata']['id']['app'],
+                                                               config['context']['pdata']['id']['portal'],
+                                                               config['context']['pdata']['id']['desktop']]).filter(
+        func.col("dimensions_type").isin("content", "app")
     ).select(
-        func.col("dimensions.sid"),
-        func.col("dimensions.pdata.id").alias("pdata_id"),
-        func.col("dimensions.type"),
-        func.col("dimensions.mode"),
-        func.col("dimensions.did"),
-        func.col("object.id").alias("object_id"),
-        func.col("edata.eks.time_spent"),
-        func.col("object.rollup.l1")
+        func.col("dimensions_sid").alias("sid"),
+        func.col("pdata_id"),
+        func.col("dimensions_type").alias("type"),
+        func.col("dimensions_mode").alias("mode"),
+        func.col("dimensions_did").alias("did"),
+        func.col("object_id"),
+        func.col("edata_eks_time_spent").alias("time_spent"),
+        func.col("object_rollup_l1").alias("l1")
     )
     app = data.filter(
         func.col('type').isin('app') &
@@ -158,20 +150,14 @@ def dialscans(result_loc_, date_):
     :return: None
     """
     spark = SparkSession.builder.appName("DialcodeScans").master("local[*]").getOrCreate()
-    account_name = os.environ['AZURE_STORAGE_ACCOUNT']
-    account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
-    container = 'telemetry-data-store'
-    spark.conf.set('fs.azure.account.key.{}.blob.core.windows.net'.format(account_name), account_key)
-    path = 'wasbs://{}@{}.blob.core.windows.net/telemetry-denormalized/raw/{}-*'.format(container, account_name,
-                                                                                        date_.strftime('%Y-%m-%d'))
+    configure_spark_storage(spark)
     failed_flag = func.udf(lambda x: 'Successful QR Scans' if x > 0 else 'Failed QR Scans')
-    data = spark.read.json(path).filter(
-        func.col("eid").isin("SEARCH") &
-        func.col('edata.filters.dialcodes').isNotNull()
+    data = read_telemetry(spark, 'raw', date_, eids_=['SEARCH']).filter(
+        func.col('edata_filters_dialcodes').isNotNull()
     ).select(
-        func.col('dialcodedata.channel').alias('dialcode_channel'),
-        func.col('edata.filters.dialcodes'),
-        failed_flag('edata.size').alias('failed_flag')
+        func.col('dialcodedata_channel').alias('dialcode_channel'),
+        func.col('edata_filters_dialcodes').alias('dialcodes'),
+        failed_flag('edata_size').alias('failed_flag')
     )
     df = data.groupby(
         func.col('dialcode_channel'),
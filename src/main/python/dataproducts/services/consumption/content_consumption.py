@@ -13,8 +13,10 @@ from string import Template
 from azure.common import AzureMissingResourceHttpError
 from cassandra.cluster import Cluster
 
-from dataproducts.util.utils import create_json, get_tenant_info, get_data_from_blob, \
-    post_data_to_blob, get_content_model, get_content_plays, push_metric_event
+from dataproducts.util.normalize_utils import mime_types, iso_dates
+from dataproducts.util.span_utils import timed
+from dataproducts.util.utils import get_tenant_info, get_data_from_blob, \
+    post_data_to_blob, get_content_model, get_content_plays, push_metric_event, write_report, write_partitions
 
 class ContentConsumption:
     def __init__(self, data_store_location, org_search, druid_hostname,
@@ -27,26 +29,7 @@ class ContentConsumption:
         self.execution_date = execution_date
         self.config = {}
 
-    def mime_type(self, series):
-        """
-        map the content format into preset buckets
-        :param series: pandas series
-        :return: pandas series
-        """
-        if series == 'video/x-youtube':
-            return 'YouTube Content'
-        elif series == 'application/vnd.ekstep.ecml-archive':
-            return 'Created on Diksha'
-        elif series == 'video/mp4' or series == 'video/webm':
-            return 'Uploaded Videos'
-        elif series == 'application/pdf' or series == 'application/epub':
-            return 'Text Content'
-        elif series == 'application/vnd.ekstep.html-archive' or series == 'application/vnd.ekstep.h5p-archive':
-            return 'Uploaded Interactive Content'
-        else:
-            return None
-
-
+    @timed()
     def define_keyspace(self, cassandra_, keyspace_, replication_factor_=1):
         """
         given cassandra cluster, keyspace and replication factor, ensure the keyspace and table exist
@@ -72,6 +55,7 @@ class ContentConsumption:
         session.execute(table_query.substitute(keyspace=keyspace_))
 
 
+    @timed()
     def insert_data_to_cassandra(self, result_loc_, date_, cassandra_, keyspace_):
         """
         Insert the content plays and timespent data into cassandra with primary key on content id, date and pdata_id
@@ -99,6 +83,7 @@ class ContentConsumption:
         cluster.shutdown()
 
 
+    @timed()
     def get_weekly_plays(self, result_loc_, date_, cassandra_, keyspace_):
         """
         query cassandra table for 1 week of content play and timespent.
@@ -157,15 +142,13 @@ class ContentConsumption:
              'lastPublishedOn', 'me_averageRating']]
         content_model["creator"] = content_model["creator"].str.replace("null", "")
         content_model['channel'] = content_model['channel'].astype(str)
-        content_model['mimeType'] = content_model['mimeType'].apply(self.mime_type)
+        content_model['mimeType'] = mime_types(content_model['mimeType'])
         content_model.columns = ['channel', 'Board', 'Medium', 'Grade', 'Subject', 'Content ID', 'Content Name',
                                  'Mime Type', 'Created On', 'Creator (User Name)', 'Last Published On',
                                  'Average Rating(out of 5)']
         content_model['Content ID'] = content_model['Content ID'].str.replace(".img", "")
-        content_model['Created On'] = content_model['Created On'].fillna('T').apply(
-            lambda x: '-'.join(x.split('T')[0].split('-')[::-1]))
-        content_model['Last Published On'] = content_model['Last Published On'].fillna('T').apply(
-            lambda x: '-'.join(x.split('T')[0].split('-')[::-1]))
+        content_model['Created On'] = iso_dates(content_model['Created On'], day_first_=True)
+        content_model['Last Published On'] = iso_dates(content_model['Last Published On'], day_first_=True)
         # content_model['Last Updated On'] = content_model['Last Updated On'].fillna('T').apply(
         #     lambda x: '-'.join(x.split('T')[0].split('-')[::-1]))
         df = content_model.join(df.set_index('identifier'), on='Content ID', how='left')
@@ -183,14 +166,14 @@ class ContentConsumption:
                        by=['channel', 'Board', 'Medium', 'Grade', 'Subject', 'Total No of Plays (App and Portal)'])
         df.to_csv(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'weekly_plays.csv'), index=False)
         post_data_to_blob(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'weekly_plays.csv'), backup=True)
-        for channel in df.channel.unique():
+
+        def write_channel(channel_, content_aggregates):
             try:
-                slug = tenant_info.loc[channel]['slug']
+                slug = tenant_info.loc[channel_]['slug']
                 print(slug)
             except KeyError:
-                continue
-            content_aggregates = df[df['channel'] == channel]
-            content_aggregates.drop(['channel'], axis=1, inplace=True)
+                return None
+            content_aggregates = content_aggregates.drop(['channel'], axis=1)
             try:
                 get_data_from_blob(result_loc_.parent.joinpath('portal_dashboards', slug, 'content_aggregates.csv'))
                 blob_data = pd.read_csv(result_loc_.parent.joinpath('portal_dashboards', slug, 'content_aggregates.csv'))
@@ -207,10 +190,11 @@ class ContentConsumption:
                  'Average Play Time in mins on App', 'Average Play Time in mins on Portal', 'Average Rating(out of 5)',
                  'Last Date of the week']]
             result_loc_.parent.joinpath('portal_dashboards', slug).mkdir(exist_ok=True)
-            content_aggregates.to_csv(result_loc_.parent.joinpath('portal_dashboards', slug, 'content_aggregates.csv'),
-                                      index=False, encoding='utf-8-sig')
-            create_json(result_loc_.parent.joinpath('portal_dashboards', slug, 'content_aggregates.csv'))
-            post_data_to_blob(result_loc_.parent.joinpath('portal_dashboards', slug, 'content_aggregates.csv'))
+            return [write_report(content_aggregates,
+                                 result_loc_.parent.joinpath('portal_dashboards', slug, 'content_aggregates.csv'),
+                                 encoding='utf-8-sig')]
+
+        write_partitions(df, 'channel', write_channel)
 
 
     def init(self):
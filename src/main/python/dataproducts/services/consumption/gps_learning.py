@@ -2,12 +2,11 @@ import os
 import sys, time
 import findspark
 import requests
+import numpy as np
 import pandas as pd
 import natsort
 import pdb
 
-from anytree.importer import DictImporter
-from anytree.search import findall
 from natsort import natsorted
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -15,6 +14,8 @@ from pyspark.sql import SparkSession
 from pyspark.sql import functions as F
 from pyspark.sql.types import StructField, StructType, StringType, IntegerType
 
+from dataproducts.util.search_utils import search_frame
+from dataproducts.util.tree_utils import CompactTree
 from dataproducts.util.utils import create_json, write_data_to_blob, post_data_to_blob, \
                 get_data_from_blob, push_metric_event, get_scan_counts, get_tenant_info
 
@@ -29,91 +30,32 @@ class GPSLearning:
         self.org_search = org_search
 
 
-    def traverse(self, data, index=""):
-        final_dict = {}
-
-        if 'dialcodes' not in data.keys():
-            dial = ''
-        else:
-            dial = data['dialcodes'][0]
-
-        if index == "":
-            final_dict['index'] = ''
-        else:
-            final_dict['index'] = index[1:]
-
-        final_dict['dialcode'] = dial
-        final_dict['name'] = data['name']
-        final_dict['contentType'] = data['contentType']
-
-        final_dict['identifier'] = data['identifier']
-
-        final_dict['children'] = []
-
-        for item in data['children']:
-
-            index1 = index + '.' + str(item['index'] if item.get('index') else 0)
-
-            if type(item) == dict:
-                if 'children' in item.keys():
-                    child_dict = self.traverse(item, index1)
-
-                    if child_dict != {}:
-                        final_dict['children'].append(child_dict)
-                else:
-                    temp_dict = {}
-
-                    if 'dialcodes' not in item.keys():
-                        dial = ''
-                    else:
-                        dial = item['dialcodes'][0]
-
-                    temp_dict['index'] = index1[1:]
-
-                    temp_dict['dialcode'] = dial
-                    temp_dict['name'] = item['name']
-                    temp_dict['contentType'] = item['contentType']
-
-                    temp_dict['identifier'] = item['identifier']
-
-                    final_dict['children'].append(temp_dict)
-
-        if final_dict['children'] == []:
-            del final_dict['children']
-
-        return final_dict
+    def traverse(self, data):
+        """
+        flatten the textbook hierarchy, indexing every node with the dotted positions of its ancestors
+        :param data: dictionary object representation of textbook
+        :return: CompactTree with index, dialcode and contentType columns
+        """
+        tree = CompactTree.build(
+            data, lambda node: [child for child in node.get('children') or [] if type(child) == dict],
+            position=lambda node: str(node['index'] if node.get('index') else 0),
+            dialcode=lambda node: node['dialcodes'][0] if 'dialcodes' in node else '',
+            contentType=lambda node: node['contentType'])
+        positions = tree['position'].tolist()
+        tree.columns['index'] = np.array(['.'.join(positions[node] for node in path[1:]) for path in tree.paths()],
+                                         dtype=object)
+        return tree
 
 
     def get_tbs(self):
-        tb_url = "{}/api/content/v1/search".format(self.content_search)
-        payload = """{
-                    "request": {
-                        "filters": {
-                            "contentType": ["Textbook"],
-                            "status": ["Live"]
-                        },
-                        "sort_by": {"createdOn":"desc"},
-                        "limit": 10000
-                    }
-                }"""
         headers = {
             'content-type': "application/json; charset=utf-8",
             'cache-control': "no-cache"
         }
-        retry_count = 0
-        while 1:
-            try:
-                response = requests.request("POST", tb_url, data=payload, headers=headers)
-                break
-            except requests.exceptions.ConnectionError:
-                print("Retry {} for textbook list".format(retry_count + 1))
-                retry_count += 1
-                sleep(10)
-                if retry_count == 5:
-                    print("Max retries reached...")
-                    break
-
-        list_of_textbooks = pd.DataFrame(response.json()['result']['content'])
+        list_of_textbooks = search_frame("{}/api/content/v1/search".format(self.content_search),
+                                         {'contentType': ['Textbook'], 'status': ['Live']},
+                                         fields_=['identifier', 'channel', 'board', 'gradeLevel', 'medium', 'name',
+                                                  'subject'], dedupe_=('identifier',))
         list_of_textbooks = list_of_textbooks[['identifier', 'channel', 'board', 'gradeLevel', 'medium', 'name', 'subject']]
         tb_list = list(list_of_textbooks.identifier.unique())
         list_of_textbooks.drop_duplicates(subset=['identifier'], keep='first', inplace=True)
@@ -157,24 +99,16 @@ class GPSLearning:
                 if 'index' not in tb['children'][0]:
                     continue
 
-                tree_obj = self.traverse(tb)
-                importer = DictImporter()
-                root = importer.import_(tree_obj)
-                resources = findall(root, filter_=lambda node: node.contentType in ("Resource"))
-                dialcodes = findall(root, filter_=lambda node: node.dialcode not in (""))
-                
-                dialcodes_with_content = []
-                for resource in resources:
-                    for ancestor in resource.ancestors:
-                        dialcodes_with_content.append((ancestor.dialcode,ancestor.index))
-                        
-                dialcodes_with_content = set([x for x in dialcodes_with_content if (x[0] != '')])
-
-                dialcodes_all = []
-                for dialcode in dialcodes:
-                    dialcodes_all.append((dialcode.dialcode, dialcode.index))
-                    
-                dialcodes_all = set([x for x in dialcodes_all if (x != '')])
+                tree = self.traverse(tb)
+                resources = np.array([content_type in ("Resource") for content_type in tree['contentType'].tolist()])
+                dialcodes = tree['dialcode'] != ''
+                # a dialcode has content when a resource is anywhere below it
+                with_resources = tree.descendant_sums(resources) > 0
+
+                dialcodes_with_content = set(zip(tree['dialcode'][dialcodes & with_resources].tolist(),
+                                                 tree['index'][dialcodes & with_resources].tolist()))
+
+                dialcodes_all = set(zip(tree['dialcode'][dialcodes].tolist(), tree['index'][dialcodes].tolist()))
 
                 no_content = pd.DataFrame(list(dialcodes_all - dialcodes_with_content), columns=['QR', 'Index'])
                 no_content['TB_ID'] = tb_id
@@ -1,170 +1,66 @@
 """
 Generate content wise reports for an aggregated, and status wise views
 """
-import re
 import sys, time
 import os
 import requests
-import numpy as np
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime
 from pathlib import Path
-from string import Template
 
+from dataproducts.util.grade_utils import grade_strings, grade_sort_keys
+from dataproducts.util.normalize_utils import mime_types, iso_dates
+from dataproducts.util.search_utils import iter_search
 from dataproducts.util.utils import get_tenant_info, create_json, post_data_to_blob, push_metric_event
 
 class ContentProgress:
-    def __init__(self, data_store_location, content_search, execution_date, org_search):
+    def __init__(self, data_store_location, content_search, execution_date, org_search, fetchers=8):
         self.data_store_location = Path(data_store_location)
         self.content_search = content_search
         self.execution_date = execution_date
         self.org_search = org_search
+        self.fetchers = fetchers
 
 
-    def grade_map(self, series):
-        """
-        convert the list of grades to string format
-        :param series: pandas series
-        :return: pandas series
-        """
-        dict_ = {}
-        try:
-            for item in series:
-                try:
-                    key = list(map(int, re.findall('\d+', item)))[0]
-                    dict_[key] = item
-                except IndexError:
-                    if item == 'KG':
-                        dict_[0] = item
-                    elif item == 'Other':
-                        dict_[13] = item
-                    else:
-                        dict_[14] = item
-            grade = ''
-            for key in sorted(list(dict_.keys())):
-                grade += dict_[key] + ', '
-            grade = grade.rstrip(', ')
-        except TypeError:
-            grade = np.nan
-        return grade
-
-
-    def mime_type(self, series):
-        """
-        map the content format into preset buckets
-        :param series: pandas series
-        :return: pandas series
-        """
-        if series == 'video/x-youtube':
-            return 'YouTube Content'
-        elif series == 'application/vnd.ekstep.ecml-archive':
-            return 'Created on Diksha'
-        elif series == 'video/mp4' or series == 'video/webm':
-            return 'Uploaded Videos'
-        elif series == 'application/pdf' or series == 'application/epub':
-            return 'Text Content'
-        elif series == 'application/vnd.ekstep.html-archive' or series == 'application/vnd.ekstep.h5p-archive':
-            return 'Uploaded Interactive Content'
-        else:
-            return None
-
-
-    def grade_sort(self, series):
-        """
-        get an index to sort all the grades by, taking into account multiple grades
-        :param series: panadas series
-        :return: pandas series
-        """
-        try:
-            result = None
-            value = sorted(list(map(int, re.findall('\d+', series))))
-            other = re.findall('Other', series)
-            if value and other:
-                result = value[0]
-                if len(value) > 1:
-                    if value[-1] < 10:
-                        result += value[-1] / 10.0
-                    else:
-                        temp = 0.9
-                        result += temp + value[-1] / 1000.0
-                result += 0.003
-            elif value and not other:
-                result = value[0]
-                if len(value) > 1:
-                    if value[-1] < 10:
-                        result += value[-1] / 10.0
-                    else:
-                        temp = 0.9
-                        result += temp + value[-1] / 1000.0
-            elif not value and other:
-                result = 13
-            elif not value and not other:
-                result = 14
-        except TypeError:
-            result = 14
-        return result
-
-
-    def date_format(self, date_):
-        """
-        date formatting from %y-%m-%dT00:00:00z000 to %y-%m-%d
-        :param date_: pandas series
-        :return: pandas series
-        """
-        return date_.split('T')[0]
-
-
-    def get_content_data(self, tenant_id_, result_loc_, content_search_):
+    def get_content_data(self, tenant_id_, result_loc_, content_search_, session_=None):
         """
         Query content search API to get resource created for a channel.
         :param tenant_id_: channel id
         :param result_loc_: pathlib.Path object to store resultant CSV at.
         :param content_search_: ip and port for server hosting content search API
+        :param session_: requests.Session shared by the tenant fetches
         :return: None
         """
-        url = "{}v3/search".format(content_search_)
-        headers = {
-            'content-type': "application/json; charset=utf-8",
-            'cache-control': "no-cache"
+        filters = {
+            'status': ['Live', 'Draft', 'Review', 'Unlisted'],
+            'contentType': ['Resource'],
+            'createdFor': tenant_id_
         }
-        payload_template = Template("""{
-                "request": {
-                    "filters":{
-                        "status": ["Live","Draft","Review","Unlisted"],
-                        "contentType": ["Resource"],
-                        "createdFor": "$tenant"
-                    },
-                    "fields" :["channel", "identifier", "board", "gradeLevel", "medium", "subject", "status",
-                    "createdBy", "creator", "lastUpdatedBy", "lastUpdatedOn", "lastSubmittedOn", "lastPublishedBy",
-                    "lastPublishedOn", "createdFor", "createdOn", "pkgVersion", "versionKey", "contentType", "mimeType",
-                    "prevState", "resourceType", "attributions"],
-                    "limit":10000,
-                    "facets":["status"]
-                }
-            }""")
-        payload = payload_template.substitute(tenant=tenant_id_)
-        retry_count = 0
-        while retry_count < 5:
-            retry_count += 1
+        fields = ['channel', 'identifier', 'board', 'gradeLevel', 'medium', 'subject', 'status', 'createdBy', 'creator',
+                  'lastUpdatedBy', 'lastUpdatedOn', 'lastSubmittedOn', 'lastPublishedBy', 'lastPublishedOn', 'createdFor',
+                  'createdOn', 'pkgVersion', 'versionKey', 'contentType', 'mimeType', 'prevState', 'resourceType',
+                  'attributions']
+        try:
+            content = [row for page in iter_search("{}v3/search".format(content_search_), filters, fields, workers_=2,
+                                                   session_=session_) for row in page]
+        except requests.exceptions.ConnectionError:
+            print("Max retries reached. Connection error for ", tenant_id_)
+            return
+        if content:
+            response_df = pd.DataFrame(content)
             try:
-                response = requests.request("POST", url, data=payload, headers=headers).json()
-                if response['result']['count'] > 0:
-                    response_df = pd.DataFrame(response['result']['content'])
-                    try:
-                        response_df['grade'] = response_df['gradeLevel'].apply(self.grade_map)
-                        response_df = response_df.drop(['gradeLevel'], axis=1)
-                    except KeyError:
-                        pass
-                    try:
-                        response_df['content format'] = response_df['mimeType'].apply(self.mime_type)
-                        response_df = response_df.drop(['mimeType'], axis=1)
-                    except KeyError:
-                        pass
-                    response_df.to_csv(result_loc_.joinpath('data.csv'), index=False, encoding='utf-8')
-                break
-            except requests.exceptions.ConnectionError:
-                print("Retrying. Connection error for ", tenant_id_)
+                response_df['grade'] = grade_strings(response_df['gradeLevel'])
+                response_df = response_df.drop(['gradeLevel'], axis=1)
+            except KeyError:
+                pass
+            try:
+                response_df['content format'] = mime_types(response_df['mimeType'])
+                response_df = response_df.drop(['mimeType'], axis=1)
+            except KeyError:
+                pass
+            response_df.to_csv(result_loc_.joinpath('data.csv'), index=False, encoding='utf-8')
 
 
     def gen_aggregated_report(self, result_loc_):
@@ -181,25 +77,12 @@ class ContentProgress:
         r1 = dataframe[['channel', 'identifier', 'board', 'medium', 'grade', 'subject', 'resourceType', 'status',
                         'content format']]
         df1 = r1.dropna(axis=0, how='any')
-        report1_g = df1.groupby(['board', 'medium', 'grade', 'subject', 'resourceType'])
-        contents = []
-        for name, grp in report1_g:
-            row = {
-                'board': name[0],
-                'medium': name[1],
-                'grade': name[2],
-                'subject': name[3],
-                'resourceType': name[4],
-                'Total Content': 0
-            }
-            statuses = grp.groupby(['status']).count()['identifier']
-            for ind, item in statuses.iteritems():
-                row[ind] = item
-                row['Total Content'] += item
-            mime_types = grp.groupby(['content format']).count()['identifier']
-            for ind, item in mime_types.iteritems():
-                row[ind] = item
-            contents.append(row)
+        group_by = ['board', 'medium', 'grade', 'subject', 'resourceType']
+        # counts per group in one pass, NaN where a group has no content of a status or format
+        statuses = df1.groupby(group_by + ['status']).size().unstack('status')
+        formats = df1.groupby(group_by + ['content format']).size().unstack('content format')
+        report1_df = statuses.drop(formats.columns.intersection(statuses.columns), axis=1).join(formats)
+        report1_df.insert(0, 'Total Content', statuses.sum(axis=1).astype(int))
         df2 = r1[r1[['board', 'medium', 'grade', 'subject']].isnull().any(axis=1)]
         row = {
             'board': 'Metadata missing',
@@ -209,22 +92,20 @@ class ContentProgress:
             'resourceType': 'Metadata missing',
             'Total Content': 0
         }
-        statuses = df2.groupby(['status']).count()['identifier']
-        for ind, item in statuses.iteritems():
+        for ind, item in df2.groupby(['status']).count()['identifier'].items():
             row[ind] = item
             row['Total Content'] += item
-        mime_types = df2.groupby(['content format']).count()['identifier']
-        for ind, item in mime_types.iteritems():
+        for ind, item in df2.groupby(['content format']).count()['identifier'].items():
             row[ind] = item
-        contents.append(row)
-        report1_df = pd.DataFrame(contents)
+        frames = [report1_df.reset_index()] if len(report1_df) else []
+        report1_df = pd.concat(frames + [pd.DataFrame([row])], ignore_index=True, sort=False)
         required_cols = ['Draft', 'Live', 'Review', 'Unlisted', 'Created on Diksha', 'YouTube Content',
                          'Uploaded Videos', 'Text Content', 'Uploaded Interactive Content']
         for col in required_cols:
             if col not in report1_df.columns:
                 report1_df[col] = 0
         report1_df = report1_df.fillna('0')
-        report1_df['gradeSort'] = report1_df['grade'].apply(self.grade_sort)
+        report1_df['gradeSort'] = grade_sort_keys(report1_df['grade'])
         report1_df = report1_df.sort_values(by=['board', 'medium', 'gradeSort', 'subject', 'resourceType'],
                                             ascending=[False, True, True, True, True])
         report1_df = report1_df[
@@ -263,21 +144,21 @@ class ContentProgress:
         review = df2[df2['status'] == 'Review'][
             ['board', 'medium', 'grade', 'subject', 'identifier', 'resourceType', 'status', 'lastSubmittedOn',
              'createdOn', 'creator']]
-        review['createdOn'] = review['createdOn'].fillna('T').apply(self.date_format)
-        review['lastSubmittedOn'] = review['lastSubmittedOn'].fillna('T').apply(self.date_format)
+        review['createdOn'] = iso_dates(review['createdOn'])
+        review['lastSubmittedOn'] = iso_dates(review['lastSubmittedOn'])
         review.columns = ['Board', 'Medium', 'Grade', 'Subject', 'Content ID', 'Content Type', 'Status',
                           'Pending in current status since', 'Creation Date', 'Created By']
         draft = df2[df2['status'] == 'Draft']
         draft1 = draft[draft['lastPublishedOn'].isna()]
-        draft1['createdOn'] = draft1['createdOn'].fillna('T').apply(self.date_format)
+        draft1['createdOn'] = iso_dates(draft1['createdOn'])
         draft1.loc[:, 'Pending in current status since'] = draft1.loc[:, 'createdOn']
         draft1 = draft1[['board', 'medium', 'grade', 'subject', 'identifier', 'resourceType', 'status',
                          'Pending in current status since', 'createdOn', 'creator']]
         draft1.columns = ['Board', 'Medium', 'Grade', 'Subject', 'Content ID', 'Content Type', 'Status',
                           'Pending in current status since', 'Creation Date', 'Created By']
         draft2 = draft.dropna(subset=['lastPublishedOn'])
-        draft2['createdOn'] = draft2['createdOn'].fillna('T').apply(self.date_format)
-        draft2['lastPublishedOn'] = draft2['lastPublishedOn'].fillna('T').apply(self.date_format)
+        draft2['createdOn'] = iso_dates(draft2['createdOn'])
+        draft2['lastPublishedOn'] = iso_dates(draft2['lastPublishedOn'])
         draft2 = draft2[
             ['board', 'medium', 'grade', 'subject', 'identifier', 'resourceType', 'status', 'lastPublishedOn',
              'createdOn', 'creator']]
@@ -285,8 +166,8 @@ class ContentProgress:
                           'Pending in current status since', 'Creation Date', 'Created By']
         limited_sharing = df2[df2['status'] == 'Unlisted']
         limited_sharing['status'] = 'Limited Sharing'
-        limited_sharing['createdOn'] = limited_sharing['createdOn'].fillna('T').apply(self.date_format)
-        limited_sharing['lastPublishedOn'] = limited_sharing['lastPublishedOn'].fillna('T').apply(self.date_format)
+        limited_sharing['createdOn'] = iso_dates(limited_sharing['createdOn'])
+        limited_sharing['lastPublishedOn'] = iso_dates(limited_sharing['lastPublishedOn'])
         limited_sharing = limited_sharing[
             ['board', 'medium', 'grade', 'subject', 'identifier', 'resourceType', 'status', 'lastPublishedOn',
              'createdOn', 'creator']]
@@ -295,7 +176,7 @@ class ContentProgress:
         report2_df = review.append(draft1, ignore_index=True)
         report2_df = report2_df.append(draft2, ignore_index=True)
         report2_df = report2_df.append(limited_sharing, ignore_index=True)
-        report2_df['gradeSort'] = report2_df['Grade'].apply(self.grade_sort)
+        report2_df['gradeSort'] = grade_sort_keys(report2_df['Grade'])
         report2_df = report2_df.sort_values(
             by=['Board', 'Medium', 'gradeSort', 'Subject', 'Content Type', 'Status'],
             ascending=[False, True, True, True, True, True])
@@ -333,11 +214,11 @@ class ContentProgress:
         report3_df = report3_df[
             ['board', 'medium', 'grade', 'subject', 'identifier', 'resourceType', 'createdOn', 'pkgVersion',
              'creator', 'lastPublishedOn']]
-        report3_df['createdOn'] = report3_df['createdOn'].fillna('T').apply(self.date_format)
-        report3_df['lastPublishedOn'] = report3_df['lastPublishedOn'].fillna('T').apply(self.date_format)
+        report3_df['createdOn'] = iso_dates(report3_df['createdOn'])
+        report3_df['lastPublishedOn'] = iso_dates(report3_df['lastPublishedOn'])
         report3_df.columns = ['Board', 'Medium', 'Grade', 'Subject', 'Content ID', 'Content Type', 'Creation Date',
                               'Number of times Published', 'Created By', 'Latest Publish Date']
-        report3_df['gradeSort'] = report3_df['Grade'].apply(self.grade_sort)
+        report3_df['gradeSort'] = grade_sort_keys(report3_df['Grade'])
         report3_df = report3_df.sort_values(by=['Board', 'Medium', 'gradeSort', 'Subject', 'Content Type'],
                                             ascending=[False, True, True, True, True])
         report3_df = report3_df.fillna('')
@@ -360,15 +241,26 @@ class ContentProgress:
         board_slug = pd.read_csv(self.data_store_location.joinpath(execution_date.strftime('%Y-%m-%d'), 'tenant_info.csv'))
         self.data_store_location.joinpath('content_progress').mkdir(exist_ok=True)
         self.data_store_location.joinpath('portal_dashboards').mkdir(exist_ok=True)
-        for ind_, row_ in board_slug.iterrows():
-            self.data_store_location.joinpath('content_progress', row_['slug']).mkdir(exist_ok=True)
-            self.get_content_data(tenant_id_=row_['id'], result_loc_=self.data_store_location.joinpath('content_progress',
-                                row_['slug']), content_search_=self.content_search)
-            if self.data_store_location.joinpath('content_progress', row_['slug'], 'data.csv').exists():
-                self.data_store_location.joinpath('portal_dashboards', row_['slug']).mkdir(exist_ok=True)
-                self.gen_aggregated_report(result_loc_=self.data_store_location.joinpath('content_progress', row_['slug']))
-                self.gen_live_status_report(result_loc_=self.data_store_location.joinpath('content_progress', row_['slug']))
-                self.gen_non_live_status_report(result_loc_=self.data_store_location.joinpath('content_progress', row_['slug']))
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=2 * self.fetchers))
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=2 * self.fetchers))
+        # reports of a tenant are generated as soon as its content is fetched, while the other tenants are fetched
+        with ThreadPoolExecutor(max_workers=self.fetchers) as executor:
+            slugs = {}
+            for ind_, row_ in board_slug.iterrows():
+                self.data_store_location.joinpath('content_progress', row_['slug']).mkdir(exist_ok=True)
+                slugs[executor.submit(self.get_content_data, tenant_id_=row_['id'],
+                                      result_loc_=self.data_store_location.joinpath('content_progress', row_['slug']),
+                                      content_search_=self.content_search, session_=session)] = row_['slug']
+            for future in as_completed(slugs):
+                future.result()
+                slug = slugs[future]
+                if self.data_store_location.joinpath('content_progress', slug, 'data.csv').exists():
+                    self.data_store_location.joinpath('portal_dashboards', slug).mkdir(exist_ok=True)
+                    self.gen_aggregated_report(result_loc_=self.data_store_location.joinpath('content_progress', slug))
+                    self.gen_live_status_report(result_loc_=self.data_store_location.joinpath('content_progress', slug))
+                    self.gen_non_live_status_report(result_loc_=self.data_store_location.joinpath('content_progress', slug))
+        session.close()
 
         print("END:Content Progress")
         end_time_sec = int(round(time.time()))
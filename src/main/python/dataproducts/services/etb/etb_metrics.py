@@ -5,83 +5,62 @@ import sys
 import os
 import time
 import requests
+import threading
 import pandas as pd
 import pdb
 
 from datetime import datetime
 from pathlib import Path
-from anytree.importer import DictImporter
-from anytree.search import findall
 
-from dataproducts.util.utils import create_json, post_data_to_blob, get_tenant_info, get_scan_counts, push_metric_event
+from dataproducts.util.grade_utils import min_grade_number, grade_title_strings
+from dataproducts.util.pipeline_utils import run_pipeline
+from dataproducts.util.row_store import RowStore
+from dataproducts.util.search_utils import search_frame
+from dataproducts.util.span_utils import timed, span
+from dataproducts.util.tree_utils import CompactTree
+from dataproducts.util.utils import create_json, post_data_to_blob, get_tenant_info, get_scan_counts, push_metric_event, \
+    write_report, write_partitions
 from dataproducts.resources.common import sorted_grades
 
+_worker_etb = None
+
+
+def init_worker(etb_):
+    global _worker_etb
+    _worker_etb = etb_
+
+
+def build_rows(row_, tb):
+    """
+    build the ETB and DCE rows of a textbook on a pipeline worker
+    :param row_: textbook metadata
+    :param tb: dictionary object representation of textbook
+    :return: tuple of dialcode_etb, textbook_etb, dialcode_dce and textbook_dce rows, None if the textbook is malformed
+    """
+    rows = ([], [], [], [])
+    try:
+        _worker_etb.process_textbook(row_, tb, *rows)
+    except KeyError:
+        return None
+    return rows
+
 
 class ETBMetrics:
-    def __init__(self, data_store_location, druid_hostname, content_search, content_hierarchy, execution_date, org_search):
+    def __init__(self, data_store_location, druid_hostname, content_search, content_hierarchy, execution_date, org_search,
+                 fetchers=8, workers=None, incremental=False):
         self.data_store_location = Path(data_store_location)
         self.druid_hostname = druid_hostname
         self.content_search = content_search
         self.content_hierarchy = content_hierarchy
         self.execution_date = execution_date
         self.org_search = org_search
+        self.fetchers = fetchers
+        self.workers = workers
+        self.incremental = incremental
         self.start_time = None
         self.backend_grade = None
 
 
-    def parse_etb(self, tb, row_):
-        """
-        Parse the textbook structure recursively for all TBUnits (chapters/ topics/ subtopics)
-        :param tb: dictionary object representation of textbook
-        :param row_: textbook metadata
-        :return: list representation of that node of textbook
-        """
-        temp = {
-            'tb_id': row_['identifier'],
-            'board': row_['board'],
-            'channel': row_['channel'],
-            'medium': row_['medium'],
-            'gradeLevel': row_['gradeLevel'],
-            'subject': row_['subject'],
-            'tb_name': row_['name'],
-            'status': row_['status'],
-            'identifier': tb['identifier'],
-            'name': tb['name'],
-            'contentType': tb['contentType']
-        }
-        try:
-            temp['leafNodesCount'] = tb['leafNodesCount']
-        except KeyError:
-            temp['leafNodesCount'] = 0
-        try:
-            temp['dialcode'] = tb['dialcodes'][0]
-        except KeyError:
-            temp['dialcode'] = ''
-        temp['children'] = []
-        if ('children' in tb.keys()) and tb['children']:
-            for child in tb['children']:
-                if child['contentType'] == 'TextBookUnit':
-                    temp['children'].append(self.parse_etb(child, row_))
-        if not temp['children']:
-            del temp['children']
-        return temp
-
-
-    def grade_sort(self, grades):
-        """
-        Grade in TB metadata is present as an array of string. In order to sort on grade, define the order
-        :param grades: array of string
-        :return: number used for sorting
-        """
-        minimum = 14
-        for grade in grades:
-            if grade != 'KG':
-                grade = grade.title()
-            if minimum > self.backend_grade.loc[grade]['number']:
-                minimum = self.backend_grade.loc[grade]['number']
-        return minimum
-
-
     def grade_fix(self, df):
         """
         format the gradeLevel column. split multiple grades into separate rows.
@@ -97,56 +76,7 @@ class ETBMetrics:
         return df
 
 
-    def etb_dialcode(self, row, nodes, dialcode_level):
-        """
-        generate the ETB detailed report.
-        :param row: textbook information
-        :param nodes: nodes that are either leaf or qr linked or both
-        :param dialcode_level: list of required details of nodes
-        :return: dialcode_level
-        """
-        for node in nodes:
-            result = {'Textbook ID': row['identifier'], 'Medium': row['medium'], 'Grade': row['grade'],
-                      'Subject': row['subject'], 'Textbook Name': row['name'], 'Textbook Status': row['status'],
-                      'Level 1 Name': '', 'Level 2 Name': '', 'Level 3 Name': '', 'Level 4 Name': '', 'Level 5 Name': '',
-                      'channel': row['createdFor'][0], 'grade_sort': self.grade_sort(row['gradeLevel']),
-                      'Type of Node': 'Leaf Node & QR Linked' if (
-                              node.dialcode != '' and node.is_leaf) else 'Leaf Node' if node.is_leaf else 'QR Linked' if
-                      node.dialcode != '' else ''}
-            level = 0
-            for path in node.path:
-                result['Level {} Name'.format(level)] = path.name
-                level += 1
-            result['Number of contents'] = node.leafNodesCount
-            result['QR Code'] = node.dialcode
-            dialcode_level.append(result)
-
-
-    def etb_textbook(self, row, node, textbook_level):
-        """
-        ETB Textbook level report
-        :param row: textbook information
-        :param node: root node of textbook
-        :param textbook_level: list of required details about textbooks
-        :return: textbook_level
-        """
-        result = {'Textbook ID': row['identifier'], 'Medium': row['medium'], 'Grade': row['grade'],
-                  'Subject': row['subject'], 'Textbook Name': row['name'], 'Textbook Status': row['status'],
-                  'Created On': '/'.join(row['createdOn'].split('T')[0].split('-')[::-1]),
-                  'Last Updated On': '/'.join(row['lastUpdatedOn'].split('T')[0].split('-')[::-1]),
-                  'channel': row['createdFor'][0], 'grade_sort': self.grade_sort(row['gradeLevel']),
-                  'Total content linked': node.leafNodesCount, 'Total QR codes linked to content': len(
-                findall(node, filter_=lambda node_: node_.leafNodesCount > 0 and node_.dialcode != '')),
-                  'Total number of QR codes with no linked content': len(
-                      findall(node, filter_=lambda node_: node_.leafNodesCount == 0 and node_.dialcode != '')),
-                  'Total number of leaf nodes': len(findall(node, filter_=lambda node_: node_.is_leaf)),
-                  'Number of leaf nodes with no content': len(
-                      findall(node, filter_=lambda node_: node_.is_leaf and node_.leafNodesCount == 0)),
-                  'With QR codes': 'With QR Code' if len(
-                      findall(node, filter_=lambda node_: node_.dialcode != '')) > 0 else 'Without QR Code'}
-        textbook_level.append(result)
-
-
+    @timed()
     def etb_aggregates(self, result_loc_, slug, df):
         """
         generate charts from ETB data
@@ -225,55 +155,7 @@ class ETBMetrics:
         post_data_to_blob(result_loc_.joinpath('portal_dashboards', slug, 'etb_qr_content_status_subject.csv'))
 
 
-    def dce_dialcode(self, row, nodes, dialcode_level):
-        """
-        generate DCE detailed report
-        :param row: textbook information
-        :param nodes: dialcodes with leafNodesCount = 0
-        :param dialcode_level: list of required details about detailed report
-        :return: dialcode_level
-        """
-        for node in nodes:
-            result = {'Textbook ID': row['identifier'], 'Medium': row['medium'], 'Grade': row['grade'],
-                      'Subject': row['subject'], 'Textbook Name': row['name'], 'Level 1 Name': '', 'Level 2 Name': '',
-                      'Level 3 Name': '', 'Level 4 Name': '', 'Level 5 Name': '', 'channel': row['createdFor'][0],
-                      'grade_sort': self.grade_sort(row['gradeLevel'])}
-            level = 0
-            for path in node.path:
-                result['Level {} Name'.format(level)] = path.name
-                level += 1
-            result['QR Code'] = node.dialcode
-            result['Term'] = node.term
-            dialcode_level.append(result)
-
-
-    def dce_textbook(self, row, node, textbook_level):
-        """
-        generate DCE Textbook level report
-        :param row: textbook information
-        :param node: textbook tree structure
-        :param textbook_level: list of details about the textbook
-        :return: textbook_level
-        """
-        result = {'Textbook ID': row['identifier'], 'Medium': row['medium'], 'Grade': row['grade'],
-                  'Subject': row['subject'], 'Textbook Name': row['name'],
-                  'Created On': '/'.join(row['createdOn'].split('T')[0].split('-')[::-1]),
-                  'Last Updated On': '/'.join(row['lastUpdatedOn'].split('T')[0].split('-')[::-1]),
-                  'channel': row['createdFor'][0], 'grade_sort': self.grade_sort(row['gradeLevel']),
-                  'Total number of QR codes': len(findall(node, filter_=lambda node_: node_.dialcode != '')),
-                  'Number of QR codes with atleast 1 linked content': len(
-                      findall(node, filter_=lambda node_: node_.leafNodesCount > 0 and node_.dialcode != '')),
-                  'Number of QR codes with no linked content': len(
-                      findall(node, filter_=lambda node_: node_.leafNodesCount == 0 and node_.dialcode != '')),
-                  'Term 1 QR Codes with no linked content': len(
-                      findall(node, filter_=lambda
-                          node_: node_.leafNodesCount == 0 and node_.dialcode != '' and node_.term == 'T1')),
-                  'Term 2 QR Codes with no linked content': len(
-                      findall(node, filter_=lambda
-                          node_: node_.leafNodesCount == 0 and node_.dialcode != '' and node_.term == 'T2'))}
-        textbook_level.append(result)
-
-
+    @timed()
     def dce_aggregates(self, result_loc_, slug, df):
         """
         generate charts from DCE textbook data.
@@ -307,6 +189,105 @@ class ETBMetrics:
         post_data_to_blob(result_loc_.joinpath('portal_dashboards', slug, 'dce_qr_content_status_subject.csv'))
 
 
+    def parse_etb(self, tb):
+        """
+        Flatten the textbook structure for all TBUnits (chapters/ topics/ subtopics)
+        :param tb: dictionary object representation of textbook
+        :return: CompactTree with the name, dialcode and leafNodesCount of the textbook and its units
+        """
+        return CompactTree.build(
+            tb, lambda node: [child for child in node.get('children') or [] if child['contentType'] == 'TextBookUnit'],
+            name=lambda node: node['name'],
+            dialcode=lambda node: node['dialcodes'][0] if 'dialcodes' in node else '',
+            leafNodesCount=lambda node: node.get('leafNodesCount', 0))
+
+
+    def process_textbook(self, row_, tb, dialcode_etb, textbook_etb, dialcode_dce, textbook_dce):
+        """
+        build the ETB and DCE rows of a textbook in a single pre-order pass over the CompactTree of its TBUnits
+        (chapters/ topics/ subtopics). the first half of the chapters and their units are in term 1, the rest in term 2.
+        :param row_: textbook metadata
+        :param tb: dictionary object representation of textbook
+        :param dialcode_etb: list of ETB dialcode level rows
+        :param textbook_etb: list of ETB textbook level rows
+        :param dialcode_dce: list of DCE dialcode level rows
+        :param textbook_dce: list of DCE textbook level rows
+        :return: None
+        """
+        tree = self.parse_etb(tb)
+        live = row_['status'] == 'Live'
+        textbook = {'Textbook ID': row_['identifier'], 'Medium': row_['medium'], 'Grade': row_['grade'],
+                    'Subject': row_['subject'], 'Textbook Name': row_['name']}
+        levels = {'Level 1 Name': '', 'Level 2 Name': '', 'Level 3 Name': '', 'Level 4 Name': '', 'Level 5 Name': ''}
+        tail = {'channel': row_['createdFor'][0], 'grade_sort': min_grade_number(row_['gradeLevel'])}
+        etb_node = dict(textbook, **{'Textbook Status': row_['status']})
+        etb_node.update(levels)
+        etb_node.update(tail)
+        dce_node = dict(textbook, **levels)
+        dce_node.update(tail)
+        names = tree['name'].tolist()
+        dialcodes = tree['dialcode'].tolist()
+        leaf_nodes_counts = tree['leafNodesCount'].tolist()
+        is_leaves = tree.is_leaf.tolist()
+        depths = tree.depth.tolist()
+        chapters = tree.count(tree.depth == 1)
+        chapter = -1
+        term = 'T1'
+        qr_codes = qr_with_content = qr_without_content = leaf_nodes = leaf_nodes_without_content = 0
+        term_qr_without_content = {'T1': 0, 'T2': 0}
+        for node, path in enumerate(tree.paths()):
+            # chapters come in order in the pre-order numbering, each followed by its units
+            if depths[node] == 1:
+                chapter += 1
+                term = 'T1' if chapter <= (chapters / 2) else 'T2'
+            is_leaf = is_leaves[node]
+            dialcode = dialcodes[node]
+            leaf_nodes_count = leaf_nodes_counts[node]
+            result = dict(etb_node, **{'Type of Node': 'Leaf Node & QR Linked' if (
+                    dialcode != '' and is_leaf) else 'Leaf Node' if is_leaf else 'QR Linked' if dialcode != '' else ''})
+            for level, index in enumerate(path):
+                result['Level {} Name'.format(level)] = names[index]
+            result['Number of contents'] = leaf_nodes_count
+            result['QR Code'] = dialcode
+            dialcode_etb.append(result)
+            if is_leaf:
+                leaf_nodes += 1
+                if leaf_nodes_count == 0:
+                    leaf_nodes_without_content += 1
+            if dialcode != '':
+                qr_codes += 1
+                if leaf_nodes_count > 0:
+                    qr_with_content += 1
+                elif leaf_nodes_count == 0:
+                    qr_without_content += 1
+                    term_qr_without_content[term] += 1
+                    if live:
+                        result = dict(dce_node)
+                        for level, index in enumerate(path):
+                            result['Level {} Name'.format(level)] = names[index]
+                        result['QR Code'] = dialcode
+                        result['Term'] = term
+                        dialcode_dce.append(result)
+        created_on = '/'.join(row_['createdOn'].split('T')[0].split('-')[::-1])
+        last_updated_on = '/'.join(row_['lastUpdatedOn'].split('T')[0].split('-')[::-1])
+        textbook_etb.append(dict(textbook, **{
+            'Textbook Status': row_['status'], 'Created On': created_on, 'Last Updated On': last_updated_on,
+            'channel': tail['channel'], 'grade_sort': tail['grade_sort'],
+            'Total content linked': leaf_nodes_counts[0], 'Total QR codes linked to content': qr_with_content,
+            'Total number of QR codes with no linked content': qr_without_content,
+            'Total number of leaf nodes': leaf_nodes, 'Number of leaf nodes with no content': leaf_nodes_without_content,
+            'With QR codes': 'With QR Code' if qr_codes > 0 else 'Without QR Code'}))
+        if live:
+            textbook_dce.append(dict(textbook, **{
+                'Created On': created_on, 'Last Updated On': last_updated_on, 'channel': tail['channel'],
+                'grade_sort': tail['grade_sort'], 'Total number of QR codes': qr_codes,
+                'Number of QR codes with atleast 1 linked content': qr_with_content,
+                'Number of QR codes with no linked content': qr_without_content,
+                'Term 1 QR Codes with no linked content': term_qr_without_content['T1'],
+                'Term 2 QR Codes with no linked content': term_qr_without_content['T2']}))
+
+
+    @timed()
     def generate_reports(self, result_loc_, content_search_, content_hierarchy_, date_):
         """
         generate the overall ETB and DCE reports at textbook and detailed levels
@@ -318,142 +299,125 @@ class ETBMetrics:
             'textbook_reports', date_.strftime('%Y-%m-%d'), 'tenant_info.csv'))[['id', 'slug']]
         board_slug.set_index('id', inplace=True)
 
-        importer = DictImporter()
         dialcode_etb = []
         textbook_etb = []
         dialcode_dce = []
         textbook_dce = []
         scans_df = pd.read_csv(result_loc_.joinpath('textbook_reports', 'dialcode_counts.csv'))
         scans_df = scans_df.groupby('edata_filters_dialcodes')['Total Scans'].sum()
-        tb_url = "{}v3/search".format(content_search_)
-        payload = """{
-                "request": {
-                    "filters": {
-                        "contentType": ["Textbook"],
-                        "status": ["Live", "Review", "Draft"]
-                    },
-                    "sort_by": {"createdOn":"desc"},
-                    "limit": 10000
-                }
-            }"""
-        tb_headers = {
-            'content-type': "application/json; charset=utf-8",
-            'cache-control': "no-cache"
-        }
-        retry_count = 0
-        while retry_count < 5:
-            try:
-                response = requests.request("POST", tb_url, data=payload, headers=tb_headers)
-                textbooks = pd.DataFrame(response.json()['result']['content'])[
-                    ['identifier', 'createdFor', 'createdOn', 'lastUpdatedOn', 'board', 'medium', 'gradeLevel', 'subject',
-                     'name', 'status', 'channel']]
-                textbooks[textbooks.duplicated(subset=['identifier', 'status'])].to_csv(
-                    result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'duplicate_tb.csv'), index=False)
-                textbooks.drop_duplicates(subset=['identifier', 'status'], inplace=True)
-                textbooks['gradeLevel'] = textbooks['gradeLevel'].apply(lambda x: ['Unknown'] if type(x) == float else x)
-                textbooks.fillna({'createdFor': ' '}, inplace=True)
-                textbooks.fillna('Unknown', inplace=True)
-                textbooks['grade'] = textbooks['gradeLevel'].apply(
-                    lambda grade: ', '.join([y if y == 'KG' else y.title() for y in grade]))
-                textbooks.to_csv(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'tb_list.csv'),
-                                 index=False)
-                break
-            except requests.exceptions.ConnectionError:
-                print("Retry {} for textbook list".format(retry_count + 1))
-                retry_count += 1
-                time.sleep(10)
-        else:
+        try:
+            with span('textbook_list'):
+                # duplicates are kept to be reported below
+                textbooks = search_frame("{}v3/search".format(content_search_),
+                                         {'contentType': ['Textbook'], 'status': ['Live', 'Review', 'Draft']},
+                                         fields_=['identifier', 'createdFor', 'createdOn', 'lastUpdatedOn', 'board',
+                                                  'medium', 'gradeLevel', 'subject', 'name', 'status', 'channel'],
+                                         dedupe_=None, workers_=self.fetchers)
+        except requests.exceptions.ConnectionError:
             print("Max retries reached...")
             return
-        counter = 0
+        textbooks[textbooks.duplicated(subset=['identifier', 'status'])].to_csv(
+            result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'duplicate_tb.csv'), index=False)
+        textbooks.drop_duplicates(subset=['identifier', 'status'], inplace=True)
+        textbooks['gradeLevel'] = textbooks['gradeLevel'].apply(lambda x: ['Unknown'] if type(x) == float else x)
+        textbooks.fillna({'createdFor': ' '}, inplace=True)
+        textbooks.fillna('Unknown', inplace=True)
+        textbooks['grade'] = grade_title_strings(textbooks['gradeLevel'])
+        textbooks.to_csv(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'tb_list.csv'),
+                         index=False)
         skipped_tbs = []
-        for ind_, row_ in textbooks.iterrows():
-            counter += 1
-            print('Running for {} out of {}: {}% ({} sec/it)'.format(counter, textbooks.shape[0],
-                                                                     '%.2f' % (counter * 100 / textbooks.shape[0]),
-                                                                     '%.2f' % ((datetime.now() - self.start_time).total_seconds()
-                                                                               / counter)))
-            if isinstance(row_['gradeLevel'], list) and len(row_['gradeLevel']) == 0:
-                row_['gradeLevel'].append(' ')
+        error_log = result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'etb_error_log.log')
+        error_log_lock = threading.Lock()
+
+        def fetch(row_):
             if row_['status'] == 'Live':
                 url = "{}learning-service/content/v3/hierarchy/{}".format(content_hierarchy_, row_['identifier'])
             else:
                 url = "{}learning-service/content/v3/hierarchy/{}?mode=edit".format(content_hierarchy_, row_['identifier'])
-            retry_count = 0
-            while retry_count < 5:
+            for retry_count in range(5):
                 try:
-                    response = requests.get(url)
-                    tb = response.json()['result']['content']
-                    tree_obj = self.parse_etb(tb, row_)
-                    root = importer.import_(tree_obj)
-                    self.etb_dialcode(row_, (root,) + root.descendants, dialcode_etb)
-                    self.etb_textbook(row_, root, textbook_etb)
-                    if row_['status'] == 'Live':
-                        chapters = findall(root, filter_=lambda node: node.depth == 1)
-                        for i in range(len(chapters)):
-                            term = 'T1' if i <= (len(chapters) / 2) else 'T2'
-                            chapters[i].term = term
-                            for descendant in chapters[i].descendants:
-                                descendant.term = term
-                        root.term = 'T1'
-                        dialcode_wo_content = findall(root,
-                                                      filter_=lambda node: node.dialcode != '' and node.leafNodesCount == 0)
-                        self.dce_dialcode(row_, dialcode_wo_content, dialcode_dce)
-                        self.dce_textbook(row_, root, textbook_dce)
-                    break
+                    response = session.get(url)
+                    return response.json()['result']['content']
                 except requests.exceptions.ConnectionError:
-                    retry_count += 1
-                    print("ConnectionError: Retry {} for textbook {}".format(retry_count, row_['identifier']))
-                    time.sleep(10)
+                    print("ConnectionError: Retry {} for textbook {}".format(retry_count + 1, row_['identifier']))
+                    time.sleep(min(2 ** retry_count, 10))
                 except KeyError:
-                    with open(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'etb_error_log.log'),
-                              'a') as f:
+                    with error_log_lock, open(error_log, 'a') as f:
                         f.write("KeyError: Resource not found for textbook {} in {}\n".format(row_['identifier'],
                                                                                               row_['status']))
-                    break
-            else:
-                print("Max retries reached...")
-                continue
-            if retry_count == 5:
-                skipped_tbs.append(row_)
-                continue
-            if response.status_code != 200:
-                continue
+                    return None
+            skipped_tbs.append(row_)
+            return None
+
+        def collect(row_, rows_):
+            if rows_ is None:
+                with error_log_lock, open(error_log, 'a') as f:
+                    f.write("KeyError: Resource not found for textbook {} in {}\n".format(row_['identifier'],
+                                                                                          row_['status']))
+                return
+            if store is not None:
+                for textbook_rows in rows_:
+                    store.tag(textbook_rows, row_)
+                built.append({key: row_[key] for key in ['identifier', 'status', 'lastUpdatedOn']})
+            dialcode_etb.extend(rows_[0])
+            textbook_etb.extend(rows_[1])
+            dialcode_dce.extend(rows_[2])
+            textbook_dce.extend(rows_[3])
 
-        etb_dc = pd.DataFrame(dialcode_etb)
+        store = None
+        built = []
+        to_build = textbooks
+        if self.incremental:
+            # rows are rebuilt only for textbooks that are new or were updated since the last run
+            store = RowStore(result_loc_.joinpath('textbook_reports', 'etb_store'), ['identifier', 'status'],
+                             'lastUpdatedOn', ['dialcode_etb', 'textbook_etb', 'dialcode_dce', 'textbook_dce'])
+            stored_items, stored_tables = store.load()
+            unchanged = store.unchanged(textbooks, stored_items)
+            to_build = textbooks.merge(unchanged, on=['identifier', 'status'], how='left', indicator=True)
+            to_build = to_build[to_build['_merge'] == 'left_only'].drop('_merge', axis=1)
+            print('Rebuilding {} out of {} textbooks'.format(to_build.shape[0], textbooks.shape[0]))
+        rows = []
+        for row_ in to_build.to_dict('records'):
+            if isinstance(row_['gradeLevel'], list) and len(row_['gradeLevel']) == 0:
+                row_['gradeLevel'].append(' ')
+            rows.append(row_)
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=self.fetchers))
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=self.fetchers))
+        run_pipeline(rows, fetch, build_rows, collect, fetchers_=self.fetchers, workers_=self.workers,
+                     initializer_=init_worker, initargs_=(self,), label_='textbooks', fetch_stage_='fetch_hierarchy',
+                     process_stage_='parse_hierarchy')
+        session.close()
+
+        if store is not None:
+            items = pd.concat([textbooks.merge(unchanged, on=['identifier', 'status']), pd.DataFrame(built)],
+                              sort=False)
+            tables = store.update(items, unchanged, stored_tables, {
+                'dialcode_etb': pd.DataFrame(dialcode_etb), 'textbook_etb': pd.DataFrame(textbook_etb),
+                'dialcode_dce': pd.DataFrame(dialcode_dce), 'textbook_dce': pd.DataFrame(textbook_dce)})
+        else:
+            tables = {'dialcode_etb': pd.DataFrame(dialcode_etb), 'textbook_etb': pd.DataFrame(textbook_etb),
+                      'dialcode_dce': pd.DataFrame(dialcode_dce), 'textbook_dce': pd.DataFrame(textbook_dce)}
+        etb_dc = tables['dialcode_etb']
         etb_dc.to_csv(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'ETB_dialcode_data_pre.csv'),
                       index=False, encoding='utf-8-sig')
         post_data_to_blob(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'ETB_dialcode_data_pre.csv'),
                           backup=True)
-        etb_tb = pd.DataFrame(textbook_etb).fillna('')
+        etb_tb = tables['textbook_etb'].fillna('')
         etb_tb.to_csv(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'ETB_textbook_data_pre.csv'),
                       index=False, encoding='utf-8-sig')
         post_data_to_blob(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'ETB_textbook_data_pre.csv'),
                           backup=True)
-        dce_dc = pd.DataFrame(dialcode_dce)
+        dce_dc = tables['dialcode_dce']
         dce_dc.to_csv(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'DCE_dialcode_data_pre.csv'),
                       index=False, encoding='utf-8-sig')
         post_data_to_blob(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'DCE_dialcode_data_pre.csv'),
                           backup=True)
-        dce_tb = pd.DataFrame(textbook_dce).fillna('')
+        dce_tb = tables['textbook_dce'].fillna('')
         dce_tb.to_csv(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'DCE_textbook_data_pre.csv'),
                       index=False, encoding='utf-8-sig')
         post_data_to_blob(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'DCE_textbook_data_pre.csv'),
                           backup=True)
-        channels = set()
-        for c in etb_dc.channel.unique():
-            if c in board_slug.index:
-                channels.add(c)
-        for c in etb_tb.channel.unique():
-            if c in board_slug.index:
-                channels.add(c)
-        for c in dce_dc.channel.unique():
-            if c in board_slug.index:
-                channels.add(c)
-        for c in dce_tb.channel.unique():
-            if c in board_slug.index:
-                channels.add(c)
-        channels = list(channels)
         etb_dc = etb_dc.join(scans_df, on='QR Code', how='left').fillna('')
         etb_dc.sort_values(by=['channel', 'Medium', 'grade_sort', 'Subject', 'Textbook Name'], inplace=True)
         etb_dc = etb_dc[
@@ -484,37 +448,29 @@ class ETBMetrics:
              'Term 2 QR Codes with no linked content']]
         dce_tb.to_csv(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'DCE_textbook_data.csv'),
                       index=False, encoding='utf-8-sig')
-        for channel in channels:
-            slug = board_slug.loc[channel]['slug']
-            df_etb_dc = etb_dc[etb_dc['channel'] == channel]
-            result_loc_.joinpath('portal_dashboards', slug).mkdir(exist_ok=True)
-            etb_dc_path = result_loc_.joinpath('portal_dashboards', slug, 'ETB_dialcode_data.csv')
-            df_etb_dc.drop('channel', axis=1).to_csv(etb_dc_path, index=False, encoding='utf-8-sig')
-            create_json(etb_dc_path)
-            post_data_to_blob(etb_dc_path)
-            df_etb_tb = etb_tb[etb_tb['channel'] == channel]
+
+        def write_channel(channel_, df_etb_dc, df_etb_tb, df_dce_dc, df_dce_tb):
+            if channel_ not in board_slug.index:
+                return None
+            slug = board_slug.loc[channel_]['slug']
             result_loc_.joinpath('portal_dashboards', slug).mkdir(exist_ok=True)
-            etb_tb_path = result_loc_.joinpath('portal_dashboards', slug, 'ETB_textbook_data.csv')
             self.etb_aggregates(result_loc_, slug, df_etb_tb)
-            df_etb_tb.drop(['channel', 'With QR codes'], axis=1).to_csv(etb_tb_path, index=False, encoding='utf-8-sig')
-            create_json(etb_tb_path)
-            post_data_to_blob(etb_tb_path)
-            df_dce_dc = dce_dc[dce_dc['channel'] == channel]
-            result_loc_.joinpath('portal_dashboards', slug).mkdir(exist_ok=True)
-            dce_dc_path = result_loc_.joinpath('portal_dashboards', slug, 'DCE_dialcode_data.csv')
-            df_dce_dc.drop('channel', axis=1).to_csv(dce_dc_path, index=False, encoding='utf-8-sig')
-            create_json(dce_dc_path)
-            post_data_to_blob(dce_dc_path)
-            df_dce_tb = dce_tb[dce_tb['channel'] == channel]
-            result_loc_.joinpath('portal_dashboards', slug).mkdir(exist_ok=True)
-            dce_tb_path = result_loc_.joinpath('portal_dashboards', slug, 'DCE_textbook_data.csv')
             try:
                 self.dce_aggregates(result_loc_, slug, df_dce_tb)
             except IndexError:
                 pass
-            df_dce_tb.drop('channel', axis=1).to_csv(dce_tb_path, index=False, encoding='utf-8-sig')
-            create_json(dce_tb_path)
-            post_data_to_blob(dce_tb_path)
+            return [
+                write_report(df_etb_dc.drop('channel', axis=1),
+                             result_loc_.joinpath('portal_dashboards', slug, 'ETB_dialcode_data.csv'), encoding='utf-8-sig'),
+                write_report(df_etb_tb.drop(['channel', 'With QR codes'], axis=1),
+                             result_loc_.joinpath('portal_dashboards', slug, 'ETB_textbook_data.csv'), encoding='utf-8-sig'),
+                write_report(df_dce_dc.drop('channel', axis=1),
+                             result_loc_.joinpath('portal_dashboards', slug, 'DCE_dialcode_data.csv'), encoding='utf-8-sig'),
+                write_report(df_dce_tb.drop('channel', axis=1),
+                             result_loc_.joinpath('portal_dashboards', slug, 'DCE_textbook_data.csv'), encoding='utf-8-sig')
+            ]
+
+        write_partitions([etb_dc, etb_tb, dce_dc, dce_tb], 'channel', write_channel)
         if skipped_tbs:
             with open(result_loc_.joinpath('textbook_reports', date_.strftime('%Y-%m-%d'), 'etb_error_log.log'), 'a') as f:
                 for tb_id in skipped_tbs:
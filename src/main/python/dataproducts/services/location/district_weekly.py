@@ -13,6 +13,7 @@ from pathlib import Path
 from string import Template
 from azure.common import AzureMissingResourceHttpError
 
+from dataproducts.util.span_utils import timed, span
 from dataproducts.util.utils import create_json, get_data_from_blob, post_data_to_blob, push_metric_event
 from dataproducts.resources.queries import district_devices, district_plays, district_scans
 
@@ -26,6 +27,7 @@ class DistrictWeekly:
         self.headers = {}
 
 
+    @timed()
     def district_devices(self, result_loc_, date_, state_):
         """
         compute unique devices for a state over a week
@@ -63,6 +65,7 @@ class DistrictWeekly:
             exit(1)
 
 
+    @timed()
     def district_plays(self, result_loc_, date_, state_):
         """
         compute content plays per district over the week for the state
@@ -100,6 +103,7 @@ class DistrictWeekly:
             exit(1)
 
 
+    @timed()
     def district_scans(self, result_loc_, date_, state_):
         """
         compute scans for a district over the week for the state
@@ -137,6 +141,7 @@ class DistrictWeekly:
             exit(1)
 
 
+    @timed()
     def merge_metrics(self, result_loc_, date_):
         """
         merge all the metrics
@@ -232,10 +237,11 @@ class DistrictWeekly:
             result_loc.joinpath(analysis_date.strftime('%Y-%m-%d'), row['slug']).mkdir(exist_ok=True)
             path = result_loc.joinpath(analysis_date.strftime('%Y-%m-%d'), row['slug'])
             if isinstance(state, str):
-                self.district_devices(result_loc_=path, date_=analysis_date, state_=state)
-                self.district_plays(result_loc_=path, date_=analysis_date, state_=state)
-                self.district_scans(result_loc_=path, date_=analysis_date, state_=state)
-                self.merge_metrics(result_loc_=path, date_=analysis_date)
+                with span('states', items=1):
+                    self.district_devices(result_loc_=path, date_=analysis_date, state_=state)
+                    self.district_plays(result_loc_=path, date_=analysis_date, state_=state)
+                    self.district_scans(result_loc_=path, date_=analysis_date, state_=state)
+                    self.merge_metrics(result_loc_=path, date_=analysis_date)
 
         end_time_sec = int(round(time.time()))
         time_taken = end_time_sec - start_time_sec
@@ -0,0 +1,58 @@
+"""
+Convert a day of denormalized raw and summary telemetry into partitioned Parquet for the downstream reports
+"""
+import time
+import findspark
+
+from datetime import datetime, timedelta
+from pyspark.sql import SparkSession
+
+from dataproducts.util.utils import push_metric_event
+from dataproducts.util.storage_utils import configure_spark_storage
+from dataproducts.util.telemetry_utils import stage_telemetry, staging_columns
+
+
+class TelemetryStaging:
+    def __init__(self, execution_date, overwrite=False):
+        self.execution_date = execution_date
+        self.overwrite = overwrite
+
+
+    def init(self):
+        start_time_sec = int(round(time.time()))
+        start_time = datetime.now()
+        print("Started at: ", start_time.strftime('%Y-%m-%d %H:%M:%S'))
+        findspark.init()
+        execution_date = datetime.strptime(self.execution_date, "%d/%m/%Y")
+        analysis_date = execution_date - timedelta(1)
+        spark = SparkSession.builder.appName("telemetry_staging").master("local[*]").getOrCreate()
+        configure_spark_storage(spark)
+        staged = 0
+        for dataset in staging_columns.keys():
+            if stage_telemetry(spark, dataset, analysis_date, overwrite_=self.overwrite):
+                staged += 1
+                print('[Success] Staged {}'.format(dataset))
+            else:
+                print('[Skipped] {} already staged'.format(dataset))
+        spark.stop()
+        end_time = datetime.now()
+        print("Ended at: ", end_time.strftime('%Y-%m-%d %H:%M:%S'))
+        print("Time taken: ", str(end_time - start_time))
+
+        end_time_sec = int(round(time.time()))
+        time_taken = end_time_sec - start_time_sec
+        metrics = [
+            {
+                "metric": "timeTakenSecs",
+                "value": time_taken
+            },
+            {
+                "metric": "date",
+                "value": analysis_date.strftime("%Y-%m-%d")
+            },
+            {
+                "metric": "noOfDatasetsStaged",
+                "value": staged
+            }
+        ]
+        push_metric_event(metrics, "Telemetry Staging")
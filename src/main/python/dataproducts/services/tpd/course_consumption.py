@@ -17,7 +17,10 @@ from pyspark.sql import functions as func
 util_path = os.path.abspath(os.path.join(__file__, '..', '..', '..', 'util'))
 sys.path.append(util_path)
 
-from utils import get_tenant_info, create_json, get_data_from_blob, post_data_to_blob, get_courses, push_metric_event
+from utils import get_tenant_info, get_data_from_blob, post_data_to_blob, get_courses, push_metric_event, \
+    write_report, write_partitions
+from telemetry_utils import read_telemetry
+from storage_utils import configure_spark_storage
 
 findspark.init()
 
@@ -31,24 +34,18 @@ def get_course_plays(result_loc_, date_):
     """
     courses = pd.read_csv(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'courses.csv'), dtype=str)
     spark = SparkSession.builder.appName("course_plays").master("local[*]").getOrCreate()
-    account_name = os.environ['AZURE_STORAGE_ACCOUNT']
-    account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
-    container = 'telemetry-data-store'
-    spark.conf.set('fs.azure.account.key.{}.blob.core.windows.net'.format(account_name), account_key)
-    path = 'wasbs://{}@{}.blob.core.windows.net/telemetry-denormalized/summary/{}-*'.format(container, account_name,
-                                                                                            date_.strftime('%Y-%m-%d'))
-    data = spark.read.json(path).filter(
-        func.col("dimensions.pdata.id").isin(config['context']['pdata']['id']['app'],
-                                             config['context']['pdata']['id']['portal']) &
-        func.col("dimensions.type").isin("content") &
-        func.col('dimensions.mode').isin('play') &
-        func.col("object.rollup.l1").isin(courses.identifier.unique().tolist())
+    configure_spark_storage(spark)
+    data = read_telemetry(spark, 'summary', date_, pdata_ids_=[config['context']['pdata']['id']['app'],
+                                                               config['context']['pdata']['id']['portal']]).filter(
+        func.col("dimensions_type").isin("content") &
+        func.col('dimensions_mode').isin('play') &
+        func.col("object_rollup_l1").isin(courses.identifier.unique().tolist())
     )
     df = data.groupby(
-        func.col("object.rollup.l1").alias('courseId'),
+        func.col("object_rollup_l1").alias('courseId'),
         func.col("uid").alias('userId')
     ).agg(
-        (func.sum("edata.eks.time_spent") / 60).alias('timespent')
+        (func.sum("edata_eks_time_spent") / 60).alias('timespent')
     ).toPandas()
     spark.stop()
     df['Date'] = date_.strftime('%Y-%m-%d')
@@ -129,27 +126,28 @@ def generate_course_usage(result_loc_, date_):
     tenant_info = pd.read_csv(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'tenant_info.csv'), dtype=str)[
         ['id', 'slug']].set_index('id')
     course_batch = pd.read_csv(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'course_batch.csv'), dtype=str)
-    for channel in course_batch.channel.unique():
+
+    def write_channel(channel_, df):
         try:
-            slug = tenant_info.loc[channel][0]
-            print(slug)
-            df = course_batch[course_batch['channel'] == channel]
-            result_loc_.parent.joinpath('portal_dashboards', slug).mkdir(exist_ok=True)
-            try:
-                get_data_from_blob(result_loc_.parent.joinpath('portal_dashboards', slug, 'course_usage.csv'))
-                blob_data = pd.read_csv(result_loc_.parent.joinpath('portal_dashboards', slug, 'course_usage.csv'))
-            except:
-                blob_data = pd.DataFrame()
-            blob_data = blob_data.append(df, sort=False).fillna('')
-            blob_data.drop_duplicates(subset=['Date', 'Course Name', 'Batch Name', 'Batch Status'], inplace=True,
-                                      keep='last')
-            blob_data.sort_values(['Date', 'Course Name', 'Batch Name', 'Batch Status'], ascending=False, inplace=True)
-            blob_data.drop('channel', axis=1).to_csv(
-                result_loc_.parent.joinpath('portal_dashboards', slug, 'course_usage.csv'), index=False)
-            create_json(result_loc_.parent.joinpath('portal_dashboards', slug, 'course_usage.csv'))
-            post_data_to_blob(result_loc_.parent.joinpath('portal_dashboards', slug, 'course_usage.csv'))
+            slug = tenant_info.loc[channel_][0]
         except KeyError:
-            print(channel, 'channel not in tenant list')
+            print(channel_, 'channel not in tenant list')
+            return None
+        print(slug)
+        result_loc_.parent.joinpath('portal_dashboards', slug).mkdir(exist_ok=True)
+        try:
+            get_data_from_blob(result_loc_.parent.joinpath('portal_dashboards', slug, 'course_usage.csv'))
+            blob_data = pd.read_csv(result_loc_.parent.joinpath('portal_dashboards', slug, 'course_usage.csv'))
+        except:
+            blob_data = pd.DataFrame()
+        blob_data = blob_data.append(df, sort=False).fillna('')
+        blob_data.drop_duplicates(subset=['Date', 'Course Name', 'Batch Name', 'Batch Status'], inplace=True,
+                                  keep='last')
+        blob_data.sort_values(['Date', 'Course Name', 'Batch Name', 'Batch Status'], ascending=False, inplace=True)
+        return [write_report(blob_data.drop('channel', axis=1),
+                             result_loc_.parent.joinpath('portal_dashboards', slug, 'course_usage.csv'))]
+
+    write_partitions(course_batch, 'channel', write_channel)
 
 
 start_time_sec = int(round(time.time()))
@@ -13,7 +13,8 @@ from elasticsearch import Elasticsearch
 util_path = os.path.abspath(os.path.join(__file__, '..', '..', '..', 'util'))
 sys.path.append(util_path)
 
-from utils import get_tenant_info, create_json, post_data_to_blob, get_courses, push_metric_event
+from utils import get_tenant_info, post_data_to_blob, get_courses, push_metric_event, write_report, \
+    write_partitions
 
 
 def get_course_enrollments(result_loc_, elastic_search_, date_, size_=1000):
@@ -38,18 +39,16 @@ def get_course_enrollments(result_loc_, elastic_search_, date_, size_=1000):
     df.columns = ['channel', 'Course Name', 'Batch Name', 'Batch Status', 'Enrolment Count', 'Completion Count']
     board_slug = pd.read_csv(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'tenant_info.csv'))[['id', 'slug']]
     board_slug.set_index('id', inplace=True)
-    for channel in df.channel.unique():
+
+    def write_channel(channel_, df1):
         try:
-            slug = board_slug.loc[channel][0]
-            df1 = df[df['channel'] == channel]
-            df1.drop(['channel'], axis=1, inplace=True)
-            result_loc_.joinpath(date_.strftime('%Y-%m-%d'), slug).mkdir(exist_ok=True)
-            df1.to_csv(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), slug, 'course_enrollments.csv'), index=False)
-            create_json(read_loc_=result_loc_.joinpath(date_.strftime('%Y-%m-%d'), slug, 'course_enrollments.csv'))
-            post_data_to_blob(
-                result_loc_=result_loc_.joinpath(date_.strftime('%Y-%m-%d'), slug, 'course_enrollments.csv'))
+            slug = board_slug.loc[channel_][0]
         except KeyError:
-            pass
+            return None
+        return [write_report(df1.drop(['channel'], axis=1),
+                             result_loc_.joinpath(date_.strftime('%Y-%m-%d'), slug, 'course_enrollments.csv'))]
+
+    write_partitions(df, 'channel', write_channel)
 
 
 start_time_sec = int(round(time.time()))
@@ -0,0 +1,123 @@
+"""
+Grade normalization shared by the ETB and Content Progress reports. Grade values repeat across rows, so every
+conversion is memoized and column conversions are computed once per unique value.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+from functools import lru_cache
+
+from dataproducts.resources.common import sorted_grades
+from dataproducts.util.normalize_utils import map_unique
+
+grade_numbers = {grade['grade']: grade['number'] for grade in sorted_grades.init()}
+_digits = re.compile(r'\d+')
+
+
+@lru_cache(maxsize=None)
+def _min_grade_number(grades_):
+    minimum = 14
+    for grade in grades_:
+        number = grade_numbers[grade if grade == 'KG' else grade.title()]
+        if minimum > number:
+            minimum = number
+    return minimum
+
+
+def min_grade_number(grades_):
+    """
+    number of the lowest grade in a list of grades, used to sort textbooks by grade
+    :param grades_: list of grade names
+    :return: number from sorted_grades, 14 for an empty list
+    """
+    return _min_grade_number(tuple(grades_))
+
+
+@lru_cache(maxsize=None)
+def grade_sort_key(grade_):
+    """
+    index to sort a comma separated grade string by, taking into account multiple grades
+    :param grade_: grade string, eg: 'Class 1, Class 4, Other'
+    :return: number
+    """
+    if not isinstance(grade_, str):
+        return 14
+    value = sorted(map(int, _digits.findall(grade_)))
+    other = 'Other' in grade_
+    if not value:
+        return 13 if other else 14
+    result = value[0]
+    if len(value) > 1:
+        if value[-1] < 10:
+            result += value[-1] / 10.0
+        else:
+            result += 0.9 + value[-1] / 1000.0
+    if other:
+        result += 0.003
+    return result
+
+
+@lru_cache(maxsize=None)
+def _grade_string(grades_):
+    by_number = {}
+    for grade in grades_:
+        digits = _digits.findall(grade)
+        if digits:
+            by_number[int(digits[0])] = grade
+        elif grade == 'KG':
+            by_number[0] = grade
+        elif grade == 'Other':
+            by_number[13] = grade
+        else:
+            by_number[14] = grade
+    return ', '.join(by_number[number] for number in sorted(by_number)).rstrip(', ')
+
+
+def grade_string(grades_):
+    """
+    convert a list of grades to a comma separated string in grade order
+    :param grades_: list of grade names
+    :return: string, nan when the grades are missing
+    """
+    try:
+        return _grade_string(tuple(grades_))
+    except TypeError:
+        return np.nan
+
+
+def grade_sort_keys(series_):
+    """
+    grade_sort_key of every value of a column
+    :param series_: pandas series of grade strings
+    :return: pandas series
+    """
+    return pd.Series(map_unique(series_, grade_sort_key, 14), index=series_.index).astype(float)
+
+
+@lru_cache(maxsize=None)
+def _grade_title_string(grades_):
+    return ', '.join([grade if grade == 'KG' else grade.title() for grade in grades_])
+
+
+def _grade_keys(series_):
+    return pd.Series([tuple(grades) if isinstance(grades, (list, tuple)) else grades for grades in series_],
+                     index=series_.index, dtype=object)
+
+
+def grade_title_strings(series_):
+    """
+    join the grades of every list of a column in their given order, title cased except KG
+    :param series_: pandas series of lists of grade names
+    :return: pandas series
+    """
+    return pd.Series(map_unique(_grade_keys(series_), _grade_title_string, np.nan), index=series_.index)
+
+
+def grade_strings(series_):
+    """
+    grade_string of every value of a column
+    :param series_: pandas series of lists of grade names
+    :return: pandas series
+    """
+    return pd.Series(map_unique(_grade_keys(series_), grade_string, np.nan), index=series_.index)
@@ -1,19 +1,88 @@
+import os
 import json
+import atexit
+import threading
 
 from kafka import KafkaProducer
 from kafka.errors import KafkaError
 
 
 def get_producer(broker_host):
-    return KafkaProducer(bootstrap_servers=[broker_host])
+    return KafkaProducer(bootstrap_servers=[broker_host], linger_ms=100, retries=3, max_block_ms=10000)
+
+
+class MetricsEmitter:
+    """
+    Process wide emitter of METRIC events. Keeps one producer per broker for the life of the process, so events
+    are batched and sent in the background instead of blocking on every send. Events that can not be delivered
+    are appended to a local file, one json per line.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, fallback_file=None):
+        self.fallback_file = fallback_file or os.environ.get('METRICS_FALLBACK_FILE', 'metrics_fallback.json')
+        self.producers = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def get_producer(self, broker_host):
+        with self.lock:
+            if broker_host not in self.producers:
+                try:
+                    self.producers[broker_host] = get_producer(broker_host)
+                    # registered after the producer so it runs before the producer's own exit hook
+                    atexit.register(self.close)
+                except KafkaError as e:
+                    # broker unreachable, keep writing to the fallback file for the rest of the process
+                    print('Metrics broker {} unreachable, writing to {}: {}'.format(broker_host, self.fallback_file, e))
+                    self.producers[broker_host] = None
+            return self.producers[broker_host]
+
+    def emit(self, broker_host, topic, metric):
+        producer = None if self.closed else self.get_producer(broker_host)
+        if producer is None:
+            self.write_fallback(topic, metric)
+            return
+        try:
+            producer.send(topic, json.dumps(metric).encode('utf-8')).add_errback(self.on_error, topic, metric)
+        except KafkaError:
+            self.write_fallback(topic, metric)
+
+    def on_error(self, topic, metric, exc):
+        print('Failed to send metric to {}: {}'.format(topic, exc))
+        self.write_fallback(topic, metric)
+
+    def write_fallback(self, topic, metric):
+        with self.lock:
+            with open(self.fallback_file, 'a') as f:
+                f.write(json.dumps({'topic': topic, 'metric': metric}) + '\n')
+
+    def flush(self, timeout=10):
+        for producer in list(self.producers.values()):
+            if producer is not None:
+                producer.flush(timeout=timeout)
+
+    def close(self, timeout=10):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        for producer in list(self.producers.values()):
+            if producer is not None:
+                try:
+                    producer.flush(timeout=timeout)
+                    producer.close(timeout=timeout)
+                except KafkaError as e:
+                    print('Failed to flush metrics: {}'.format(e))
 
 
 def push_metrics(broker_host, topic, metric):
-    jd = json.dumps(metric)
-    producer = get_producer(broker_host)
-    result = producer.send(topic, jd.encode('utf-8'))
-    try:
-        record_metadata = result.get(timeout=10)
-    except KafkaError:
-        log.exception()
-    pass
\ No newline at end of file
+    MetricsEmitter.get_instance().emit(broker_host, topic, metric)
@@ -0,0 +1,54 @@
+"""
+Normalize report columns whose values repeat across rows, eg: mime types and ISO dates. A column has few unique values
+compared with its rows, so every conversion is computed once per unique value and mapped back to the rows.
+"""
+import numpy as np
+import pandas as pd
+
+mime_type_buckets = {
+    'video/x-youtube': 'YouTube Content',
+    'application/vnd.ekstep.ecml-archive': 'Created on Diksha',
+    'video/mp4': 'Uploaded Videos',
+    'video/webm': 'Uploaded Videos',
+    'application/pdf': 'Text Content',
+    'application/epub': 'Text Content',
+    'application/vnd.ekstep.html-archive': 'Uploaded Interactive Content',
+    'application/vnd.ekstep.h5p-archive': 'Uploaded Interactive Content'
+}
+
+
+def map_unique(series_, func_, missing_):
+    """
+    apply a function to the unique values of a column only
+    :param series_: pandas series
+    :param func_: function of a value
+    :param missing_: result for missing values
+    :return: numpy array with a result per row
+    """
+    codes, uniques = pd.factorize(series_)
+    values = np.array([func_(unique) for unique in uniques] + [missing_], dtype=object)
+    return values[codes]
+
+
+def mime_types(series_):
+    """
+    map the mime types of a column into the preset content format buckets
+    :param series_: pandas series of mime types
+    :return: pandas series, None for mime types without a bucket
+    """
+    return pd.Series(map_unique(series_, mime_type_buckets.get, None), index=series_.index)
+
+
+def iso_dates(series_, day_first_=False, separator_='-'):
+    """
+    date part of ISO timestamps, eg: 2020-01-31T00:00:00.000+0000 to 2020-01-31, or to 31-01-2020 with day_first_
+    :param series_: pandas series of ISO timestamps
+    :param day_first_: reverse the date to day, month and year
+    :param separator_: separator of the reversed date
+    :return: pandas series, empty strings for missing timestamps
+    """
+    codes, uniques = pd.factorize(series_.fillna('T'))
+    dates = pd.Series(uniques, dtype=object).str.split('T').str[0]
+    if day_first_:
+        dates = dates.str.split('-').str[::-1].str.join(separator_)
+    return pd.Series(dates.values[codes], index=series_.index)
@@ -0,0 +1,132 @@
+"""
+Stream items through a pool of fetcher threads for the network bound work into a bounded queue, and from the queue
+through a pool of worker processes for the CPU bound work. Progress is printed as throughput and ETA.
+"""
+import time
+import queue
+import threading
+import multiprocessing
+
+from collections import deque
+from datetime import timedelta
+
+from dataproducts.util.span_utils import span, record, current_span
+
+_done = object()
+
+
+class Progress:
+    def __init__(self, total, label='items', interval=30):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.done = 0
+        self.start = time.time()
+        self.last_print = self.start
+
+    def update(self, count=1):
+        self.done += count
+        now = time.time()
+        if now - self.last_print >= self.interval or self.done == self.total:
+            self.last_print = now
+            elapsed = now - self.start
+            rate = self.done / elapsed if elapsed else 0.0
+            eta = timedelta(seconds=int((self.total - self.done) / rate)) if rate else 'unknown'
+            print('{} out of {} {} ({:.2f}%) at {:.2f}/sec, elapsed {}, ETA {}'.format(
+                self.done, self.total, self.label, self.done * 100.0 / self.total if self.total else 100.0, rate,
+                timedelta(seconds=int(elapsed)), eta))
+
+
+def _timed_call(process_, item_, payload_):
+    wall_start = time.time()
+    cpu_start = time.process_time()
+    result = process_(item_, payload_)
+    return result, time.time() - wall_start, time.process_time() - cpu_start
+
+
+def run_pipeline(items_, fetch_, process_, on_result_, fetchers_=8, workers_=None, queue_size_=64, initializer_=None,
+                 initargs_=(), label_='items', fetch_stage_='fetch', process_stage_='process'):
+    """
+    fetch every item on fetcher threads, process the fetched payloads on worker processes and hand the results to
+    on_result_ in the calling thread
+    :param items_: list of items
+    :param fetch_: function(item) returning the payload to process, or None to skip the item
+    :param process_: picklable module level function(item, payload) run on the workers, returns a picklable result
+    :param on_result_: function(item, result) called in the calling thread
+    :param fetchers_: number of fetcher threads
+    :param workers_: number of worker processes, defaults to the CPU count. 0 processes in the calling thread
+    :param queue_size_: maximum fetched payloads waiting to be processed
+    :param initializer_: function(*initargs_) run once in each worker, and in the calling thread when workers_ is 0
+    :param initargs_: arguments of the initializer
+    :param label_: name of the items in the progress messages
+    :param fetch_stage_: span name of the fetches
+    :param process_stage_: span name of the processing
+    :return: None
+    """
+    parent = current_span()
+    progress = Progress(len(items_), label_)
+    pending_items = queue.Queue()
+    for item in items_:
+        pending_items.put(item)
+    fetched = queue.Queue(maxsize=queue_size_)
+
+    def fetcher():
+        while True:
+            try:
+                item = pending_items.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                with span(fetch_stage_, items=1, parent=parent):
+                    payload = fetch_(item)
+            except Exception as e:
+                fetched.put((item, e))
+                continue
+            fetched.put((item, payload))
+        fetched.put(_done)
+
+    # the pool forks before any fetcher thread starts
+    pool = multiprocessing.Pool(workers_, initializer_, initargs_) if workers_ != 0 else None
+    if pool is None and initializer_ is not None:
+        initializer_(*initargs_)
+    threads = [threading.Thread(target=fetcher, daemon=True) for _ in range(max(min(fetchers_, len(items_)), 1))]
+    for thread in threads:
+        thread.start()
+    in_flight = deque()
+    max_in_flight = 2 * (workers_ or multiprocessing.cpu_count())
+
+    def collect():
+        item, async_result = in_flight.popleft()
+        result, wall_secs, cpu_secs = async_result.get()
+        record(process_stage_, wall_secs, cpu_secs, items=1, parent=parent)
+        on_result_(item, result)
+        progress.update()
+
+    try:
+        running = len(threads)
+        while running:
+            entry = fetched.get()
+            if entry is _done:
+                running -= 1
+                continue
+            item, payload = entry
+            if isinstance(payload, Exception):
+                raise payload
+            if payload is None:
+                progress.update()
+                continue
+            if pool is None:
+                with span(process_stage_, items=1, parent=parent):
+                    result = process_(item, payload)
+                on_result_(item, result)
+                progress.update()
+                continue
+            in_flight.append((item, pool.apply_async(_timed_call, (process_, item, payload))))
+            while len(in_flight) >= max_in_flight:
+                collect()
+        while in_flight:
+            collect()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
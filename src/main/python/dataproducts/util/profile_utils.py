@@ -0,0 +1,119 @@
+"""
+Profile a job run from the dataproducts CLI. CPU profiles use pyinstrument when it is installed and cProfile
+otherwise, memory profiles use tracemalloc. Output goes to <data_store_location>/profiles/<job>/<date>.
+"""
+import io
+import time
+import pstats
+import cProfile
+import tracemalloc
+
+from datetime import datetime
+from pathlib import Path
+
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+
+def get_profile_path(result_loc_, job_, date_):
+    """
+    folder to write the profiles of a job run to
+    :param result_loc_: data store location
+    :param job_: job (sub-command) name
+    :param date_: DD/MM/YYYY execution date of the job
+    :return: Path
+    """
+    profile_path = Path(result_loc_).joinpath('profiles', job_, datetime.strptime(date_, '%d/%m/%Y').strftime('%Y-%m-%d'))
+    profile_path.mkdir(parents=True, exist_ok=True)
+    return profile_path
+
+
+def write_cpu_profile(profiler_, profile_path_, prefix_, top_):
+    """
+    write the CPU profile and a summary of the top functions by cumulative and own time
+    :param profiler_: stopped pyinstrument Profiler or cProfile.Profile
+    :param profile_path_: folder to write to
+    :param prefix_: file name prefix for this run
+    :param top_: number of functions in the summary
+    :return: summary file path
+    """
+    summary_path = profile_path_.joinpath('{}_cpu_summary.txt'.format(prefix_))
+    if Profiler is not None and isinstance(profiler_, Profiler):
+        with open(profile_path_.joinpath('{}_cpu.html'.format(prefix_)), 'w') as f:
+            f.write(profiler_.output_html())
+        with open(summary_path, 'w') as f:
+            f.write(profiler_.output_text(unicode=False, color=False))
+        return summary_path
+    profiler_.dump_stats(str(profile_path_.joinpath('{}_cpu.prof'.format(prefix_))))
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler_, stream=summary)
+    for sort_key in ['cumulative', 'tottime']:
+        summary.write('Top {} functions by {}\n'.format(top_, sort_key))
+        stats.sort_stats(sort_key).print_stats(top_)
+    with open(summary_path, 'w') as f:
+        f.write(summary.getvalue())
+    return summary_path
+
+
+def write_memory_profile(snapshot_, peak_, profile_path_, prefix_, top_):
+    """
+    write the peak traced memory and the top allocating lines
+    :param snapshot_: tracemalloc snapshot taken at the end of the run
+    :param peak_: peak traced memory in bytes
+    :param profile_path_: folder to write to
+    :param prefix_: file name prefix for this run
+    :param top_: number of lines in the summary
+    :return: summary file path
+    """
+    summary_path = profile_path_.joinpath('{}_memory_summary.txt'.format(prefix_))
+    with open(summary_path, 'w') as f:
+        f.write('Peak traced memory: {:.2f} MB\n'.format(peak_ / 1048576.0))
+        f.write('Top {} allocations by line still held at the end of the run\n'.format(top_))
+        for stat in snapshot_.statistics('lineno')[:top_]:
+            f.write('{}\n'.format(stat))
+    return summary_path
+
+
+def run_job(job_, job_name_, profile_=None, result_loc_=None, date_=None, top_=30):
+    """
+    run the init of a job, profiling it if asked to
+    :param job_: job object with an init method
+    :param job_name_: job (sub-command) name
+    :param profile_: None, 'cpu', 'memory' or 'both'
+    :param result_loc_: data store location, defaults to the working directory
+    :param date_: DD/MM/YYYY execution date of the job, defaults to today
+    :param top_: number of entries in the summaries
+    :return: None
+    """
+    if not profile_:
+        job_.init()
+        return
+    profile_path = get_profile_path(result_loc_ or '.', job_name_, date_ or datetime.today().strftime('%d/%m/%Y'))
+    prefix = time.strftime('%H%M%S')
+    cpu = profile_ in ('cpu', 'both')
+    memory = profile_ in ('memory', 'both')
+    profiler = None
+    if cpu:
+        profiler = Profiler() if Profiler is not None else cProfile.Profile()
+    if memory:
+        tracemalloc.start(25)
+    if isinstance(profiler, cProfile.Profile):
+        profiler.enable()
+    elif profiler is not None:
+        profiler.start()
+    try:
+        job_.init()
+    finally:
+        if profiler is not None:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+            else:
+                profiler.stop()
+            print('CPU profile: {}'.format(write_cpu_profile(profiler, profile_path, prefix, top_)))
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('Memory profile: {}'.format(write_memory_profile(snapshot, peak, profile_path, prefix, top_)))
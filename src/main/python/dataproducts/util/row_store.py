@@ -0,0 +1,115 @@
+"""
+Rows built per item, eg: per textbook, kept in a local columnar store between runs. Items are identified by key columns
+and a version column, so a run only rebuilds the rows of new or changed items. Tables are stored as parquet when pyarrow
+is installed and as pickled DataFrames otherwise.
+"""
+import json
+import pandas as pd
+
+from pathlib import Path
+
+try:
+    import pyarrow
+    store_format = 'parquet'
+except ImportError:
+    store_format = 'pickle'
+
+
+class RowStore:
+    def __init__(self, path, keys, version, tables, schema_version=1):
+        """
+        :param path: folder of the store
+        :param keys: columns identifying an item
+        :param version: column that changes whenever the rows of an item change, eg: lastUpdatedOn
+        :param tables: names of the row tables built per item
+        :param schema_version: bump to discard the stored rows when the way rows are built changes
+        """
+        self.path = Path(path)
+        self.keys = list(keys)
+        self.version = version
+        self.tables = list(tables)
+        self.schema_version = schema_version
+        self.key_columns = ['_{}'.format(key) for key in self.keys]
+
+    def _file(self, name_):
+        return self.path.joinpath('{}.{}'.format(name_, 'parquet' if store_format == 'parquet' else 'pkl'))
+
+    def _read(self, name_):
+        if store_format == 'parquet':
+            return pd.read_parquet(self._file(name_))
+        return pd.read_pickle(str(self._file(name_)))
+
+    def _write(self, df_, name_):
+        if store_format == 'parquet':
+            df_.to_parquet(self._file(name_), index=False)
+        else:
+            df_.reset_index(drop=True).to_pickle(str(self._file(name_)))
+
+    def load(self):
+        """
+        read the stored items and rows, nothing when the store is missing or was written by another schema version
+        :return: items DataFrame and dictionary of table name to DataFrame
+        """
+        meta_path = self.path.joinpath('meta.json')
+        empty = pd.DataFrame(columns=self.keys + [self.version])
+        if not meta_path.exists():
+            return empty, {}
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('schema_version') != self.schema_version or meta.get('format') != store_format:
+            return empty, {}
+        try:
+            return self._read('items'), {name: self._read(name) for name in self.tables}
+        except (OSError, ValueError):
+            return empty, {}
+
+    def unchanged(self, items_, stored_items_):
+        """
+        items whose key and version match the stored ones
+        :param items_: DataFrame with the key and version columns of the current items
+        :param stored_items_: items DataFrame from load
+        :return: DataFrame of the key columns of the unchanged items
+        """
+        matched = items_[self.keys + [self.version]].astype(str).merge(
+            stored_items_[self.keys + [self.version]].astype(str), on=self.keys + [self.version], how='inner')
+        return matched[self.keys].drop_duplicates()
+
+    def update(self, items_, unchanged_, stored_tables_, built_tables_):
+        """
+        combine the stored rows of the unchanged items with the rows built in this run, store and return them. rows of
+        items that are no longer in items_ are dropped.
+        :param items_: DataFrame with the key and version columns of the items that have rows after this run
+        :param unchanged_: DataFrame of the key columns of the unchanged items
+        :param stored_tables_: dictionary of table name to DataFrame from load
+        :param built_tables_: dictionary of table name to DataFrame of the rows built in this run, with the key columns
+        :return: dictionary of table name to DataFrame without the key columns
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        kept_keys = unchanged_.astype(str).rename(columns=dict(zip(self.keys, self.key_columns)))
+        tables = {}
+        for name in self.tables:
+            frames = []
+            if name in stored_tables_ and not stored_tables_[name].empty:
+                stored = stored_tables_[name]
+                frames.append(stored.merge(kept_keys, on=self.key_columns, how='inner'))
+            if name in built_tables_ and not built_tables_[name].empty:
+                frames.append(built_tables_[name])
+            table = pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame(columns=self.key_columns)
+            self._write(table, name)
+            tables[name] = table.drop(self.key_columns, axis=1)
+        self._write(items_[self.keys + [self.version]].astype(str).reset_index(drop=True), 'items')
+        with open(self.path.joinpath('meta.json'), 'w') as f:
+            json.dump({'schema_version': self.schema_version, 'format': store_format}, f)
+        return tables
+
+    def tag(self, rows_, item_):
+        """
+        add the key columns of an item to its rows
+        :param rows_: list of row dictionaries
+        :param item_: dictionary with the key columns of the item
+        :return: rows_
+        """
+        for row in rows_:
+            for key, column in zip(self.keys, self.key_columns):
+                row[column] = str(item_[key])
+        return rows_
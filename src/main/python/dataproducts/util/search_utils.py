@@ -0,0 +1,150 @@
+"""
+Page through the content search API. Pages are fetched concurrently by offset, and result sets larger than the search
+window are first split into createdOn ranges, so results are never truncated at the window size.
+"""
+import json
+import time
+import requests
+import pandas as pd
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# content search is backed by elasticsearch, which does not page past offset + limit of 10000
+max_window = 10000
+# identifier breaks createdOn ties, so every offset of a window sees the same order and pages neither repeat nor skip
+page_order = {'createdOn': 'asc', 'identifier': 'asc'}
+headers = {
+    'content-type': "application/json; charset=utf-8",
+    'cache-control': "no-cache"
+}
+
+
+def parse_created_on(value_):
+    return datetime.strptime(value_, '%Y-%m-%dT%H:%M:%S.%f%z')
+
+
+def format_created_on(value_):
+    value_ = value_.astimezone(timezone.utc)
+    return '{}.{:03d}+0000'.format(value_.strftime('%Y-%m-%dT%H:%M:%S'), value_.microsecond // 1000)
+
+
+def post_search(session_, url_, filters_, limit_, offset_=0, fields_=None, sort_by_=None, retries_=5):
+    """
+    one content search request, retried with back off
+    :param session_: requests.Session
+    :param url_: search API url
+    :param filters_: dictionary of search filters
+    :param limit_: page size
+    :param offset_: page offset
+    :param fields_: list of fields to return
+    :param sort_by_: dictionary of field to asc or desc
+    :param retries_: number of attempts
+    :return: total count of the filters and list of content on the page
+    """
+    request = {'filters': filters_, 'limit': limit_, 'offset': offset_}
+    if fields_:
+        request['fields'] = fields_
+    if sort_by_:
+        request['sort_by'] = sort_by_
+    for retry_count in range(retries_):
+        try:
+            response = session_.post(url_, data=json.dumps({'request': request}), headers=headers)
+            if response.status_code == 200:
+                result = response.json()['result']
+                return result.get('count', 0), result.get('content') or []
+            print('Search failed with status {}: retry {}'.format(response.status_code, retry_count + 1))
+        except requests.exceptions.ConnectionError:
+            print('ConnectionError: retry {} for search'.format(retry_count + 1))
+        time.sleep(min(2 ** retry_count, 10))
+    raise requests.exceptions.ConnectionError('Search failed after {} attempts: {}'.format(retries_, url_))
+
+
+def get_windows(session_, url_, filters_, window_size_=max_window):
+    """
+    split the filters into createdOn ranges of at most window_size_ results each
+    :param session_: requests.Session
+    :param url_: search API url
+    :param filters_: dictionary of search filters
+    :param window_size_: maximum results of a range
+    :return: list of filters and their result count
+    """
+    count, _ = post_search(session_, url_, filters_, 0)
+    if count <= window_size_:
+        return [(filters_, count)]
+    first = post_search(session_, url_, filters_, 1, fields_=['createdOn'], sort_by_={'createdOn': 'asc'})[1]
+    last = post_search(session_, url_, filters_, 1, fields_=['createdOn'], sort_by_={'createdOn': 'desc'})[1]
+    ranges = [(parse_created_on(first[0]['createdOn']), parse_created_on(last[0]['createdOn']) + timedelta(seconds=1))]
+    windows = []
+    while ranges:
+        start, end = ranges.pop()
+        window = dict(filters_, createdOn={'>=': format_created_on(start), '<': format_created_on(end)})
+        count, _ = post_search(session_, url_, window, 0)
+        if count > window_size_ and end - start > timedelta(seconds=1):
+            middle = start + (end - start) / 2
+            ranges.extend([(middle, end), (start, middle)])
+            continue
+        if count > window_size_:
+            print('{} results created within a second, only the first {} are returned'.format(count, window_size_))
+        if count:
+            windows.append((window, min(count, window_size_)))
+    return windows
+
+
+def iter_search(url_, filters_, fields_=None, page_size_=1000, workers_=4, window_size_=max_window, session_=None):
+    """
+    fetch every page of a search, workers_ pages at a time
+    :param url_: search API url
+    :param filters_: dictionary of search filters
+    :param fields_: list of fields to return
+    :param page_size_: results per request
+    :param workers_: concurrent requests
+    :param window_size_: maximum offset + limit the search API serves
+    :param session_: requests.Session to reuse, a new one by default
+    :return: generator of lists of content
+    """
+    session = session_ or requests.Session()
+    try:
+        pages = [(window, offset) for window, count in get_windows(session, url_, filters_, window_size_)
+                 for offset in range(0, count, page_size_)]
+        with ThreadPoolExecutor(max_workers=workers_) as executor:
+            pending = deque()
+            for window, offset in pages:
+                pending.append(executor.submit(post_search, session, url_, window, min(page_size_, window_size_ - offset),
+                                               offset, fields_, page_order))
+                if len(pending) >= workers_ * 2:
+                    yield pending.popleft().result()[1]
+            while pending:
+                yield pending.popleft().result()[1]
+    finally:
+        if session_ is None:
+            session.close()
+
+
+def search_frame(url_, filters_, fields_=None, dedupe_=('identifier', 'status'), **kwargs):
+    """
+    all the results of a search in one DataFrame
+    :param url_: search API url
+    :param filters_: dictionary of search filters
+    :param fields_: list of fields to return, also the columns of the DataFrame
+    :param dedupe_: columns identifying a result, results seen on an earlier page are dropped
+    :param kwargs: arguments of iter_search
+    :return: DataFrame
+    """
+    seen = set()
+    frames = []
+    for page in iter_search(url_, filters_, fields_, **kwargs):
+        if dedupe_:
+            rows = []
+            for content in page:
+                key = tuple(content.get(column) for column in dedupe_)
+                if key not in seen:
+                    seen.add(key)
+                    rows.append(content)
+            page = rows
+        if page:
+            frames.append(pd.DataFrame(page, columns=fields_) if fields_ else pd.DataFrame(page))
+    if not frames:
+        return pd.DataFrame(columns=fields_)
+    return pd.concat(frames, ignore_index=True, sort=False)
@@ -0,0 +1,151 @@
+"""
+Time the stages of a job. Spans nest, record wall time, CPU time and item counts, and are added to the METRIC
+event sent by push_metric_event.
+"""
+import time
+import functools
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span:
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = OrderedDict()
+        self.wall_secs = 0.0
+        self.cpu_secs = 0.0
+        self.calls = 0
+        self.items = 0
+
+    @property
+    def path(self):
+        if self.parent is None or self.parent.parent is None:
+            return self.name
+        return '{}.{}'.format(self.parent.path, self.name)
+
+    def child(self, name):
+        with _lock:
+            if name not in self.children:
+                self.children[name] = Span(name, self)
+            return self.children[name]
+
+    def add_items(self, count=1):
+        """
+        count items processed in the span, eg: textbooks or rows
+        :param count: number of items
+        :return: None
+        """
+        with _lock:
+            self.items += count
+
+
+_root = Span('job')
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = [_root]
+    return _local.stack
+
+
+@contextmanager
+def span(name, items=0, parent=None):
+    """
+    time a stage of the job. repeated spans of the same name under the same parent add up.
+    :param name: stage name
+    :param items: number of items processed in the stage
+    :param parent: span to nest under when running in another thread, defaults to the enclosing span of this thread
+    :return: Span
+    """
+    stack = _stack()
+    current = (parent or stack[-1]).child(name)
+    stack.append(current)
+    wall_start = time.time()
+    cpu_start = time.process_time()
+    try:
+        yield current
+    finally:
+        stack.pop()
+        with _lock:
+            current.wall_secs += time.time() - wall_start
+            current.cpu_secs += time.process_time() - cpu_start
+            current.calls += 1
+            current.items += items
+
+
+def timed(name=None):
+    """
+    decorator to time every call of a function as a span
+    :param name: stage name, defaults to the function name
+    :return: decorator
+    """
+    def decorator(func_):
+        @functools.wraps(func_)
+        def wrapper(*args, **kwargs):
+            with span(name or func_.__name__):
+                return func_(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name, wall_secs, cpu_secs, items=0, parent=None):
+    """
+    add a measurement taken outside of a span, eg: in a worker process, to the span of that name
+    :param name: stage name
+    :param wall_secs: wall time in seconds
+    :param cpu_secs: CPU time in seconds
+    :param items: number of items processed
+    :param parent: span to nest under, defaults to the enclosing span of this thread
+    :return: None
+    """
+    current = (parent or _stack()[-1]).child(name)
+    with _lock:
+        current.wall_secs += wall_secs
+        current.cpu_secs += cpu_secs
+        current.calls += 1
+        current.items += items
+
+
+def current_span():
+    """
+    innermost open span of this thread
+    :return: Span
+    """
+    return _stack()[-1]
+
+
+def get_stage_metrics():
+    """
+    flatten the recorded spans to metrics of the form stage.<path>.<measure>
+    :return: list of metric dictionaries
+    """
+    metrics = []
+
+    def visit(node_):
+        for child in node_.children.values():
+            prefix = 'stage.{}'.format(child.path)
+            metrics.append({'metric': prefix + '.wallSecs', 'value': round(child.wall_secs, 3)})
+            metrics.append({'metric': prefix + '.cpuSecs', 'value': round(child.cpu_secs, 3)})
+            metrics.append({'metric': prefix + '.calls', 'value': child.calls})
+            if child.items:
+                metrics.append({'metric': prefix + '.items', 'value': child.items})
+            visit(child)
+
+    with _lock:
+        visit(_root)
+    return metrics
+
+
+def reset_spans():
+    """
+    drop the recorded spans once they are reported
+    :return: None
+    """
+    with _lock:
+        _root.children.clear()
@@ -0,0 +1,106 @@
+"""
+Resolve logical telemetry datasets to storage URIs, and report blobs to a blob client, for the configured backend.
+STORAGE_BACKEND selects the backend: 'wasbs' (default, Azure blob storage) or 'file' (local folders under
+LOCAL_STORAGE_PATH, laid out as <container>/<prefix>/<date>-*.json.gz like the blob containers).
+"""
+import os
+import shutil
+
+from azure.common import AzureMissingResourceHttpError
+from azure.storage.blob import BlockBlobService
+
+default_container = 'telemetry-data-store'
+
+datasets = {
+    'raw': 'telemetry-denormalized/raw',
+    'summary': 'telemetry-denormalized/summary',
+    'unique': 'unique',
+    'ingest': 'ingest',
+    'parquet': 'telemetry-parquet'
+}
+
+
+def get_storage_backend():
+    """
+    storage backend configured for this process
+    :return: 'wasbs' or 'file'
+    """
+    backend = os.environ.get('STORAGE_BACKEND', 'wasbs')
+    if backend not in ('wasbs', 'file'):
+        raise ValueError('Unsupported storage backend: {}'.format(backend))
+    return backend
+
+
+def get_local_storage_path():
+    """
+    root folder of the 'file' backend
+    :return: LOCAL_STORAGE_PATH, or the working directory when it is unset
+    """
+    return os.environ.get('LOCAL_STORAGE_PATH', '.')
+
+
+def get_container_uri(container_=default_container):
+    """
+    root URI of a container on the configured backend
+    :param container_: blob container name
+    :return: URI string without a trailing slash
+    """
+    if get_storage_backend() == 'file':
+        return 'file://{}'.format(os.path.abspath(os.path.join(get_local_storage_path(), container_)))
+    return 'wasbs://{}@{}.blob.core.windows.net'.format(container_, os.environ['AZURE_STORAGE_ACCOUNT'])
+
+
+def get_dataset_uri(dataset_, date_=None, container_=default_container):
+    """
+    URI for a logical dataset, optionally narrowed to the files of one date
+    :param dataset_: one of the keys in datasets, or a raw prefix
+    :param date_: datetime object
+    :param container_: blob container name
+    :return: URI string
+    """
+    uri = '{}/{}'.format(get_container_uri(container_), datasets.get(dataset_, dataset_))
+    if date_ is not None:
+        uri = '{}/{}-*'.format(uri, date_.strftime('%Y-%m-%d'))
+    return uri
+
+
+def configure_spark_storage(spark_):
+    """
+    set the credentials spark needs to read from the configured backend
+    :param spark_: SparkSession
+    :return: None
+    """
+    if get_storage_backend() == 'wasbs':
+        account_name = os.environ['AZURE_STORAGE_ACCOUNT']
+        account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
+        spark_.conf.set('fs.azure.account.key.{}.blob.core.windows.net'.format(account_name), account_key)
+
+
+class LocalBlobService:
+    """
+    stand-in for BlockBlobService on the 'file' backend. blobs are files under LOCAL_STORAGE_PATH/<container>.
+    """
+    def __init__(self, root_):
+        self.root = root_
+
+    def get_blob_to_path(self, container_name, blob_name, file_path):
+        source = os.path.join(self.root, container_name, blob_name)
+        if not os.path.exists(source):
+            raise AzureMissingResourceHttpError('Missing resource!', 404)
+        shutil.copyfile(source, file_path)
+
+    def create_blob_from_path(self, container_name, blob_name, file_path):
+        destination = os.path.join(self.root, container_name, blob_name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(file_path, destination)
+
+
+def get_blob_service():
+    """
+    blob client for the configured backend
+    :return: BlockBlobService or LocalBlobService
+    """
+    if get_storage_backend() == 'file':
+        return LocalBlobService(get_local_storage_path())
+    return BlockBlobService(account_name=os.environ['AZURE_STORAGE_ACCOUNT'],
+                            account_key=os.environ['AZURE_STORAGE_ACCESS_KEY'])
@@ -0,0 +1,152 @@
+"""
+Stage denormalized telemetry from daily JSON.gz blobs into partitioned Parquet and read it back.
+"""
+from pyspark.sql import functions as func
+from pyspark.sql.types import StructType, StructField, StringType, LongType, DoubleType
+
+from dataproducts.util.storage_utils import get_dataset_uri
+
+# flattened columns kept for each dataset with their staged type. partition columns are date, eid and pdata_id.
+staging_columns = {
+    'raw': {
+        'pdata': 'context.pdata.id',
+        'columns': [
+            ('context.env', 'context_env', 'string'),
+            ('context.did', 'context_did', 'string'),
+            ('object.id', 'object_id', 'string'),
+            ('edata.subtype', 'edata_subtype', 'string'),
+            ('edata.state', 'edata_state', 'string'),
+            ('edata.size', 'edata_size', 'long'),
+            ('edata.filters.dialcodes', 'edata_filters_dialcodes', 'string'),
+            ('dialcodedata.channel', 'dialcodedata_channel', 'string')
+        ]
+    },
+    'summary': {
+        'pdata': 'dimensions.pdata.id',
+        'columns': [
+            ('uid', 'uid', 'string'),
+            ('dimensions.sid', 'dimensions_sid', 'string'),
+            ('dimensions.did', 'dimensions_did', 'string'),
+            ('dimensions.type', 'dimensions_type', 'string'),
+            ('dimensions.mode', 'dimensions_mode', 'string'),
+            ('object.id', 'object_id', 'string'),
+            ('object.rollup.l1', 'object_rollup_l1', 'string'),
+            ('edata.eks.time_spent', 'edata_eks_time_spent', 'double')
+        ]
+    }
+}
+
+partition_columns = ['date', 'eid', 'pdata_id']
+
+staging_types = {
+    'string': StringType(),
+    'long': LongType(),
+    'double': DoubleType()
+}
+
+
+def get_staging_schema(dataset_):
+    """
+    fixed schema of the staged Parquet for a dataset, so every date is written and read with the same types
+    :param dataset_: one of the keys in staging_columns
+    :return: pyspark StructType
+    """
+    fields = [StructField(alias, staging_types[type_], True)
+              for _, alias, type_ in staging_columns[dataset_]['columns']]
+    fields += [StructField(name, StringType(), True) for name in partition_columns]
+    return StructType(fields)
+
+
+def has_field(schema_, path_):
+    """
+    check if a dotted path exists in a (nested) spark schema
+    :param schema_: pyspark StructType
+    :param path_: dotted column path eg: context.pdata.id
+    :return: Boolean
+    """
+    for name in path_.split('.'):
+        if not hasattr(schema_, 'names') or name not in schema_.names:
+            return False
+        schema_ = schema_[name].dataType
+    return True
+
+
+def get_source_path(dataset_, date_):
+    """
+    path of the raw JSON.gz blobs for a dataset and date
+    :param dataset_: one of the keys in staging_columns
+    :param date_: datetime object
+    :return: URI string
+    """
+    return get_dataset_uri(dataset_, date_)
+
+
+def get_staged_path(dataset_):
+    """
+    root path of the staged Parquet for a dataset
+    :param dataset_: one of the keys in staging_columns
+    :return: URI string
+    """
+    return '{}/{}'.format(get_dataset_uri('parquet'), dataset_)
+
+
+def is_staged(spark_, dataset_, date_):
+    """
+    check if the date partition is already written for a dataset
+    :param spark_: SparkSession
+    :param dataset_: one of the keys in staging_columns
+    :param date_: datetime object
+    :return: Boolean
+    """
+    hadoop_path = spark_._jvm.org.apache.hadoop.fs.Path(
+        '{}/date={}'.format(get_staged_path(dataset_), date_.strftime('%Y-%m-%d')))
+    file_system = hadoop_path.getFileSystem(spark_._jsc.hadoopConfiguration())
+    return file_system.exists(hadoop_path)
+
+
+def stage_telemetry(spark_, dataset_, date_, overwrite_=False):
+    """
+    convert a day of JSON.gz telemetry to Parquet partitioned by date, eid and pdata_id, keeping only the
+    columns used by the reports.
+    :param spark_: SparkSession
+    :param dataset_: one of the keys in staging_columns
+    :param date_: datetime object
+    :param overwrite_: restage the date even if the partition exists
+    :return: Boolean, True if the date was staged in this call
+    """
+    if not overwrite_ and is_staged(spark_, dataset_, date_):
+        return False
+    spec = staging_columns[dataset_]
+    data = spark_.read.json(get_source_path(dataset_, date_))
+    columns = [func.lit(date_.strftime('%Y-%m-%d')).alias('date'), func.col('eid').cast('string'),
+               func.col(spec['pdata']).cast('string').alias('pdata_id')]
+    for path, alias, type_ in spec['columns']:
+        if has_field(data.schema, path):
+            columns.append(func.col(path).cast(staging_types[type_]).alias(alias))
+        else:
+            columns.append(func.lit(None).cast(staging_types[type_]).alias(alias))
+    spark_.conf.set('spark.sql.sources.partitionOverwriteMode', 'dynamic')
+    data.select(*columns).write.partitionBy(*partition_columns).mode('overwrite').parquet(
+        get_staged_path(dataset_))
+    return True
+
+
+def read_telemetry(spark_, dataset_, date_, eids_=None, pdata_ids_=None):
+    """
+    read staged telemetry for a date, staging it first if it is not yet available. filters on eid and pdata_id
+    are applied on partition columns so only the matching directories are scanned.
+    :param spark_: SparkSession
+    :param dataset_: one of the keys in staging_columns
+    :param date_: datetime object
+    :param eids_: list of eids to keep
+    :param pdata_ids_: list of pdata ids to keep
+    :return: pyspark DataFrame
+    """
+    stage_telemetry(spark_, dataset_, date_)
+    data = spark_.read.schema(get_staging_schema(dataset_)).parquet(get_staged_path(dataset_)).filter(
+        func.col('date') == date_.strftime('%Y-%m-%d'))
+    if eids_:
+        data = data.filter(func.col('eid').isin(eids_))
+    if pdata_ids_:
+        data = data.filter(func.col('pdata_id').isin(pdata_ids_))
+    return data
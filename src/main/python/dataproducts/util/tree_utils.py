@@ -0,0 +1,95 @@
+"""
+Compact representation of a content hierarchy. The nodes are numbered in pre-order and described by parallel arrays,
+so the subtree of node i is the range i to end[i] and predicates over the nodes are numpy expressions.
+"""
+import numpy as np
+
+
+class CompactTree:
+    def __init__(self, parent, depth, end, columns):
+        self.parent = np.array(parent, dtype=np.int32)
+        self.depth = np.array(depth, dtype=np.int32)
+        self.end = np.array(end, dtype=np.int32)
+        self.is_leaf = self.end == np.arange(1, len(end) + 1)
+        self.columns = {name: np.array(values) for name, values in columns.items()}
+
+    @classmethod
+    def build(cls, root_, children_, **columns_):
+        """
+        flatten a hierarchy in one pass
+        :param root_: dictionary of the root node
+        :param children_: function(node) returning the list of child nodes to keep
+        :param columns_: column name to function(node) returning the value of the column
+        :return: CompactTree
+        """
+        parent, depth, end = [], [], []
+        columns = {name: [] for name in columns_}
+        stack = [(root_, -1, 0)]
+        open_nodes = []
+        while stack:
+            node, parent_index, level = stack.pop()
+            index = len(parent)
+            # close the subtrees this node is not part of
+            while open_nodes and depth[open_nodes[-1]] >= level:
+                end[open_nodes.pop()] = index
+            parent.append(parent_index)
+            depth.append(level)
+            end.append(index + 1)
+            for name, get in columns_.items():
+                columns[name].append(get(node))
+            open_nodes.append(index)
+            for child in reversed(children_(node)):
+                stack.append((child, index, level + 1))
+        for index in open_nodes:
+            end[index] = len(parent)
+        return cls(parent, depth, end, columns)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def subtree(self, node_):
+        """
+        pre-order indices of the node and its descendants
+        :param node_: node index
+        :return: range
+        """
+        return range(node_, self.end[node_])
+
+    def path(self, node_):
+        """
+        node indices from the root to the node
+        :param node_: node index
+        :return: list of node indices
+        """
+        path = [node_]
+        while self.parent[path[-1]] >= 0:
+            path.append(self.parent[path[-1]])
+        return path[::-1]
+
+    def paths(self):
+        """
+        node indices from the root to every node, sharing the prefixes
+        :return: list of tuples of node indices
+        """
+        paths = []
+        for index, parent in enumerate(self.parent):
+            paths.append(paths[parent] + (index,) if parent >= 0 else (index,))
+        return paths
+
+    def descendant_sums(self, values_):
+        """
+        sum of the values over the descendants of every node, excluding the node itself
+        :param values_: array with a value per node
+        :return: array
+        """
+        totals = np.concatenate([[0], np.cumsum(values_)])
+        return totals[self.end] - totals[np.arange(1, len(self) + 1)]
+
+    def where(self, mask_):
+        return np.flatnonzero(mask_)
+
+    def count(self, mask_):
+        return int(np.count_nonzero(mask_))
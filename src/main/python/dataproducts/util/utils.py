@@ -10,13 +10,16 @@ import requests
 import pandas as pd
 
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from pytz import timezone
 from azure.common import AzureMissingResourceHttpError
-from azure.storage.blob import BlockBlobService
 
 from dataproducts.util.kafka_utils import push_metrics
+from dataproducts.util.search_utils import search_frame
+from dataproducts.util.span_utils import timed, span, current_span, get_stage_metrics, reset_spans
+from dataproducts.util.storage_utils import get_blob_service
 from dataproducts.resources.common import common_config
 from dataproducts.resources.queries import content_list, scan_counts, \
                     course_list, content_plays
@@ -66,6 +69,7 @@ def parse_tb(tb, returnable, row_):
             parse_tb(child, returnable, row_)
 
 
+@timed()
 def get_textbook_snapshot(result_loc_, content_search_, content_hierarchy_, date_):
     """
      get a list of textbook from LP API and iterate over the textbook hierarchy to create CSV
@@ -76,43 +80,21 @@ def get_textbook_snapshot(result_loc_, content_search_, content_hierarchy_, date
     :return:
     """
     result_loc_.joinpath(date_.strftime('%Y-%m-%d')).mkdir(exist_ok=True)
-    tb_url = "{}v3/search".format(content_search_)
-    payload = """{
-                "request": {
-                    "filters": {
-                        "contentType": ["Textbook"],
-                        "status": ["Live"]
-                    },
-                    "sort_by": {"createdOn":"desc"},
-                    "limit": 10000
-                }
-            }"""
-    tb_headers = {
-        'content-type': "application/json; charset=utf-8",
-        'cache-control': "no-cache"
-    }
-    retry_count = 0
-    while retry_count < 5:
-        retry_count += 1
-        try:
-            response = requests.request("POST", tb_url, data=payload, headers=tb_headers)
-            textbooks = pd.DataFrame(response.json()['result']['content'])[
-                ['identifier', 'channel', 'board', 'medium', 'gradeLevel', 'subject', 'name', 'status']]
-            textbooks[textbooks.duplicated(subset=['identifier', 'status'])].to_csv(
-                result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'duplicate_tb.csv'), index=False)
-            textbooks.drop_duplicates(subset=['identifier', 'status'], inplace=True)
-            textbooks.fillna({'gradeLevel': ' ', 'createdFor': ' '}, inplace=True)
-            textbooks.fillna('', inplace=True)
-            textbooks.to_csv(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'tb_list.csv'), index=False)
-            break
-        except requests.exceptions.ConnectionError:
-            print("Retry {} for textbook list".format(retry_count))
-            sleep(10)
-    else:
+    try:
+        textbooks = search_frame("{}v3/search".format(content_search_), {'contentType': ['Textbook'], 'status': ['Live']},
+                                 fields_=['identifier', 'channel', 'board', 'medium', 'gradeLevel', 'subject', 'name',
+                                          'status'], dedupe_=None)
+    except requests.exceptions.ConnectionError:
         print("Max retries reached...")
         with open(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'etb_error_log.log'), 'a') as f:
             f.write('ConnectionError: Could not get textbook list.\n')
         return
+    textbooks[textbooks.duplicated(subset=['identifier', 'status'])].to_csv(
+        result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'duplicate_tb.csv'), index=False)
+    textbooks.drop_duplicates(subset=['identifier', 'status'], inplace=True)
+    textbooks.fillna({'gradeLevel': ' ', 'createdFor': ' '}, inplace=True)
+    textbooks.fillna('', inplace=True)
+    textbooks.to_csv(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'tb_list.csv'), index=False)
     counter = 0
     textbook_list = []
     for ind_, row_ in textbooks.iterrows():
@@ -144,6 +126,7 @@ def get_textbook_snapshot(result_loc_, content_search_, content_hierarchy_, date
                       backup=True)
 
 
+@timed()
 def get_tenant_info(result_loc_, org_search_, date_):
     """
     get channel, slug, name of all orgs in current environment
@@ -193,6 +176,7 @@ def get_tenant_info(result_loc_, org_search_, date_):
         print("Max retries reached...")
 
 
+@timed()
 def get_content_model(result_loc_, druid_, date_):
     """
     get current content model snapshot
@@ -225,6 +209,7 @@ def get_content_model(result_loc_, druid_, date_):
         raise Exception('Getting Content Snapshot Failed!')
 
 
+@timed()
 def get_scan_counts(result_loc_, druid_, date_):
     """
     get dialcode level scan counts for given period
@@ -265,6 +250,7 @@ def get_scan_counts(result_loc_, druid_, date_):
         raise Exception('Getting Scan Counts Failed! :: ' + str(e))
 
 
+@timed()
 def create_json(read_loc_, last_update=False):
     """
     convert csv to json with last updated date (optional)
@@ -304,6 +290,7 @@ def create_json(read_loc_, last_update=False):
         raise Exception('Failed to create JSON!')
 
 
+@timed()
 def get_data_from_blob(result_loc_, backup=False):
     """
     read a blob storage file
@@ -313,9 +300,7 @@ def get_data_from_blob(result_loc_, backup=False):
     """
     try:
         result_loc_.parent.mkdir(exist_ok=True)
-        account_name = os.environ['AZURE_STORAGE_ACCOUNT']
-        account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
-        block_blob_service = BlockBlobService(account_name=account_name, account_key=account_key)
+        block_blob_service = get_blob_service()
 
         if backup:
             container_name = 'portal-reports-backup'
@@ -341,6 +326,7 @@ def get_data_from_blob(result_loc_, backup=False):
         raise Exception('Could not read from blob!')
 
 
+@timed()
 def post_data_to_blob(result_loc_, backup=False):
     """
     write a local file to blob storage.
@@ -349,9 +335,7 @@ def post_data_to_blob(result_loc_, backup=False):
     :return: None
     """
     try:
-        account_name = os.environ['AZURE_STORAGE_ACCOUNT']
-        account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
-        block_blob_service = BlockBlobService(account_name=account_name, account_key=account_key)
+        block_blob_service = get_blob_service()
         if backup:
             container_name = 'portal-reports-backup'
             file_name = result_loc_.name
@@ -379,6 +363,53 @@ def post_data_to_blob(result_loc_, backup=False):
         raise Exception('Failed to post to blob!')
 
 
+def write_report(df_, path_, **kwargs):
+    """
+    write a portal report CSV, create its JSON and post both to blob storage
+    :param df_: DataFrame
+    :param path_: pathlib.Path object of the CSV
+    :param kwargs: arguments of DataFrame.to_csv, eg: encoding
+    :return: path_
+    """
+    path_.parent.mkdir(exist_ok=True)
+    df_.to_csv(path_, index=False, **kwargs)
+    create_json(path_)
+    post_data_to_blob(path_)
+    return path_
+
+
+@timed()
+def write_partitions(frames_, by_, write_, keys_=None, workers_=8):
+    """
+    split frames on a column once and write the reports of every partition, eg: every tenant, on a thread pool
+    :param frames_: DataFrame or list of DataFrames to split on the same column
+    :param by_: column or index level to split on, eg: channel or slug
+    :param write_: function(key, *partitions) writing the reports of a partition and returning the list of files written,
+    or None when the partition is skipped. frames without rows for the key get an empty partition.
+    :param keys_: partition keys to write, defaults to the keys of all the frames
+    :param workers_: number of partitions written concurrently
+    :return: list of dictionaries with the key, rows, files written and wall time of every partition
+    """
+    frames = [frames_] if isinstance(frames_, pd.DataFrame) else list(frames_)
+    indices = [frame.groupby(by_, sort=False).indices for frame in frames]
+    if keys_ is None:
+        keys_ = list(dict.fromkeys(key for index in indices for key in index))
+    parent = current_span()
+
+    def write(key_):
+        start = time.time()
+        partitions = [frame.iloc[index.get(key_, [])] for frame, index in zip(frames, indices)]
+        rows = sum(len(partition) for partition in partitions)
+        with span('partition', items=rows, parent=parent):
+            files = write_(key_, *partitions)
+        return {'partition': key_, 'rows': rows, 'files': len(files or []), 'skipped': files is None,
+                'wallSecs': round(time.time() - start, 3)}
+
+    with ThreadPoolExecutor(max_workers=workers_) as executor:
+        return list(executor.map(write, keys_))
+
+
+@timed()
 def get_courses(result_loc_, druid_, date_):
     """
     query content model snapshot on druid but filter for courses.
@@ -397,6 +428,7 @@ def get_courses(result_loc_, druid_, date_):
     post_data_to_blob(result_loc_.joinpath(date_.strftime('%Y-%m-%d'), 'courses.csv'), backup=True)
 
 
+@timed()
 def get_content_plays(result_loc_, date_, druid_):
     """
     Get content plays and timespent by content id.
@@ -423,9 +455,7 @@ def get_content_plays(result_loc_, date_, druid_):
 
 
 def write_data_to_blob(read_loc, file_name):
-    account_name = os.environ['AZURE_STORAGE_ACCOUNT']
-    account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
-    block_blob_service = BlockBlobService(account_name=account_name, account_key=account_key)
+    block_blob_service = get_blob_service()
 
     container_name = 'reports'
 
@@ -463,8 +493,9 @@ def push_metric_event(metrics_list, subsystem):
     metrics = {
         "system": "AdhocJob",
         "subsystem": subsystem,
-        "metrics": metrics_list
+        "metrics": metrics_list + get_stage_metrics()
     }
+    reset_spans()
     metric = {
         "eid": eid,
         "ver": "3.0",
@@ -1,5 +1,6 @@
 import os
 import sys
+import traceback
 import findspark
 from pyspark.sql import SparkSession
 from pyspark.sql import functions as func
@@ -11,10 +12,13 @@ util_path = os.path.abspath(os.path.join(__file__, '..', 'util'))
 sys.path.append(util_path)
 resources_path = os.path.abspath(os.path.join(__file__, '..', 'resources'))
 sys.path.append(resources_path)
+# storage backend resolution is shared with the dataproducts package
+package_path = os.path.abspath(os.path.join(__file__, '..', '..'))
+sys.path.append(package_path)
 
 from azure_utils import copy_data, delete_data
-from postgres_utils import executeQuery
-from replay_utils import push_data, getDates, getBackUpDetails, getKafkaTopic, getInputPrefix, restoreBackupData, backupData, deleteBackupData, getFilterStr, getFilterDetails
+from replay_utils import push_data, getDates, getBackUpDetails, getKafkaTopic, getInputPrefix, restoreBackupData, backupData, deleteBackupData, getFilterStr, getFilterDetails, getSparkSession, disableDruidSegments, planDate
+from scheduler_utils import runDates, isStepDone, markStep, clearState, getDateRanges, getMeasuredThroughput, backedUpStep, pushedStep, cleanedStep, segmentsDisabledStep, segmentsDisableFailedStep, failedStep, restoreFailedStep
 import replay_config
 
 
@@ -28,6 +32,22 @@ parser.add_argument("end_date", type=str, help="YYYY-MM-DD, replay end date")
 parser.add_argument("kafka_broker_list", type=str, help="kafka broker details")
 #parser.add_argument("kafka_topic", type=str, help="kafka topic")
 parser.add_argument("delete_backups", type=str, default="False", help="boolean flag whether to delete backups")
+parser.add_argument("--linger_ms", type=int, help="kafka producer linger.ms, time to wait for a batch to fill")
+parser.add_argument("--batch_size", type=int, help="kafka producer batch.size in bytes")
+parser.add_argument("--compression_type", type=str, choices=["lz4", "snappy", "gzip", "none"],
+                    help="kafka producer compression codec")
+parser.add_argument("--max_concurrent_dates", type=int, default=2, help="number of dates replayed at the same time")
+parser.add_argument("--state_dir", type=str, default="replay_state",
+                    help="folder for per date replay state, used to resume an interrupted replay")
+parser.add_argument("--max_events_per_sec", type=float,
+                    help="events/sec budget shared by all the dates and partitions being replayed, unlimited by default")
+parser.add_argument("--target_latency_ms", type=int, default=500,
+                    help="send latency above which a rate limited replay backs off")
+parser.add_argument("--plan", action="store_true", help="only list the files per date and estimate the replay, nothing is written")
+parser.add_argument("--sample_files", type=int, default=1,
+                    help="files read per date in plan mode to estimate event counts, 0 to skip sampling")
+parser.add_argument("--events_per_sec", type=float,
+                    help="replay throughput for plan estimates, defaults to the throughput recorded in state_dir")
 
 args = parser.parse_args()
 container = args.container
@@ -36,6 +56,15 @@ start_date = args.start_date
 end_date = args.end_date
 kafka_broker_list = args.kafka_broker_list
 delete_backups = args.delete_backups
+max_concurrent_dates = args.max_concurrent_dates
+state_dir = args.state_dir
+# dates run concurrently, so each one gets an equal share of the budget
+dateEventsPerSec = args.max_events_per_sec / max_concurrent_dates if args.max_events_per_sec else None
+producerConfig = {
+    "linger_ms": args.linger_ms,
+    "batch_size": args.batch_size,
+    "compression_type": args.compression_type
+}
 
 config_json = replay_config.init()
 
@@ -50,67 +79,145 @@ config_json = replay_config.init()
 #if delete backups is false
 # load_data from prefix and push to kafka topic
 
-dateRange = getDates(start_date, end_date)
-print(dateRange)
-print(delete_backups)
-try:       
-    filterString = getFilterStr(getFilterDetails(config_json, prefix))
-    for date in dateRange:
-        try:
-            input_prefix = getInputPrefix(config_json, prefix)
-            if delete_backups == "True":
-                sinkSourcesList = getBackUpDetails(config_json, prefix)
-                # take backups before replay
-                print("Taking backups before starting replay")
-                copy_data(container, input_prefix, 'backup-{}'.format(input_prefix), date)
+# move the backups of a date back to their source folders after a failed push. the outcome is recorded in the
+# state file so the next run either starts the date over or retries the restore
+def restoreDate(date, input_prefix, backup_prefix, sinkSourcesList=None):
+    try:
+        copy_data(container, backup_prefix, input_prefix, date)
+        delete_data(container, backup_prefix, date)
+        if sinkSourcesList is not None:
+            restoreBackupData(sinkSourcesList, container, date)
+    except Exception:
+        markStep(state_dir, prefix, date, restoreFailedStep)
+        print("Error while restoring backups for {}. Rerun to retry the restore".format(date.strftime('%Y-%m-%d')))
+        raise
+    clearState(state_dir, prefix, date)
+    markStep(state_dir, prefix, date, failedStep)
+
+def replayDate(date):
+    input_prefix = getInputPrefix(config_json, prefix)
+    backup_prefix = 'backup-{}'.format(input_prefix)
+    kafkaTopic = getKafkaTopic(config_json, prefix)
+    sinkSourcesList = getBackUpDetails(config_json, prefix) if delete_backups == "True" else None
+    if isStepDone(state_dir, prefix, date, cleanedStep):
+        print("Replay already completed for {}. Skipping".format(date.strftime('%Y-%m-%d')))
+        return
+    if isStepDone(state_dir, prefix, date, restoreFailedStep):
+        print("Retrying the restore of backups for {}".format(date.strftime('%Y-%m-%d')))
+        restoreDate(date, input_prefix, backup_prefix, sinkSourcesList)
+    if isStepDone(state_dir, prefix, date, failedStep):
+        # the backups were restored, so the date starts over
+        clearState(state_dir, prefix, date)
+    if delete_backups == "True":
+        if not isStepDone(state_dir, prefix, date, backedUpStep):
+            # take backups before replay
+            print("Taking backups before starting replay")
+            copy_data(container, input_prefix, backup_prefix, date)
+            delete_data(container, input_prefix, date)
+            backupData(sinkSourcesList, container, date)
+            markStep(state_dir, prefix, date, backedUpStep)
+            print("Taking backups completed. Starting data replay")
+        if not isStepDone(state_dir, prefix, date, pushedStep):
+            try:
+                totals = push_data(kafka_broker_list, kafkaTopic, container, backup_prefix, date, filters, producerConfig, spark,
+                                   dateEventsPerSec, args.target_latency_ms)
+                markStep(state_dir, prefix, date, pushedStep, totals)
+                print("Data replay completed")
+            except Exception:
+                #restore backups if replay fails
+                print("Error while data replay, restoring backups")
+                restoreDate(date, input_prefix, backup_prefix, sinkSourcesList)
+                print("Error while data replay, backups restored")
+                raise
+        # delete backups after replay, druid segments are disabled for all the cleaned dates at the end
+        print("Data replay completed. Deleting backups")
+        delete_data(container, backup_prefix, date)
+        deleteBackupData(sinkSourcesList, container, date)
+        markStep(state_dir, prefix, date, cleanedStep)
+        print("Data replay completed. Deleted backups")
+    else:
+        if "failed" in prefix:
+            if not isStepDone(state_dir, prefix, date, pushedStep):
+                totals = push_data(kafka_broker_list, kafkaTopic, container, prefix, date, filters, producerConfig, spark,
+                                   dateEventsPerSec, args.target_latency_ms)
+                markStep(state_dir, prefix, date, pushedStep, totals)
+        else:
+            if not isStepDone(state_dir, prefix, date, backedUpStep):
+                copy_data(container, input_prefix, backup_prefix, date)
                 delete_data(container, input_prefix, date)
-                backupData(sinkSourcesList, container, date)
-                print("Taking backups completed. Starting data replay")
-                kafkaTopic = getKafkaTopic(config_json, prefix)
+                markStep(state_dir, prefix, date, backedUpStep)
+            if not isStepDone(state_dir, prefix, date, pushedStep):
                 try:
-                    backup_prefix = 'backup-{}'.format(input_prefix)
-                    push_data(kafka_broker_list, kafkaTopic, container, backup_prefix, date, filterString)
+                    totals = push_data(kafka_broker_list, kafkaTopic, container, backup_prefix, date, filters, producerConfig, spark,
+                                       dateEventsPerSec, args.target_latency_ms)
+                    markStep(state_dir, prefix, date, pushedStep, totals)
                     print("Data replay completed")
                 except Exception:
-                    #restore backups if replay fails 
-                    print("Error while data replay, restoring backups") 
-                    copy_data(container, 'backup-{}'.format(input_prefix), input_prefix, date)
-                    delete_data(container, 'backup-{}'.format(input_prefix), date)
-                    restoreBackupData(sinkSourcesList, container, date)
-                    print("Error while data replay, backups restored") 
-                    log.exception()        
-                    raise  
-                # delete backups and disable segments after replay
-                print("Data replay completed. Deleting backups and druid segments")
-                delete_data(container, 'backup-{}'.format(input_prefix), date)
-                deleteBackupData(sinkSourcesList, container, date)
-                print("Data replay completed. Deleted backups and druid segments")   
-            else:
-                if "failed" in prefix:
-                    kafkaTopic = getKafkaTopic(config_json, prefix)
-                    push_data(kafka_broker_list, kafkaTopic, container, prefix, date, filterString)
-                else:  
-                    backup_dir = 'backup-{}'.format(input_prefix)
-                    copy_data(container, input_prefix, backup_dir, date)
-                    delete_data(container, input_prefix, date)
-                    kafkaTopic = getKafkaTopic(config_json, prefix)
-                    try:
-                        push_data(kafka_broker_list, kafkaTopic, container, backup_dir, date, filterString)
-                        print("Data replay completed")
-                    except Exception: 
-                        print("Error while data replay, restoring backups")
-                        copy_data(container, 'backup-{}'.format(input_prefix), input_prefix, date)
-                        delete_data(container, 'backup-{}'.format(input_prefix), date) 
-        except Exception:
-            print("Replay failed for {}. Continuing replay for remaining dates".format(date.strftime('%Y-%m-%d')))
-            log.exception()
-            pass
-except Exception:
-        raise
-
-
-
-
-
-
+                    print("Error while data replay, restoring backups")
+                    restoreDate(date, input_prefix, backup_prefix)
+                    raise
+        markStep(state_dir, prefix, date, cleanedStep)
+
+def formatDuration(secs):
+    return str(timedelta(seconds=int(secs))) if secs is not None else "unknown"
+
+def planReplay(dateRange):
+    # the data is read from where it is before the backup is taken
+    plan_prefix = prefix if "failed" in prefix else getInputPrefix(config_json, prefix)
+    eventsPerSec = args.events_per_sec or getMeasuredThroughput(state_dir)
+    spark = getSparkSession() if args.sample_files > 0 else None
+    try:
+        plans = [planDate(container, plan_prefix, date, filters, args.sample_files, spark) for date in dateRange]
+    finally:
+        if spark is not None:
+            spark.stop()
+    totalSecs = 0
+    for plan in plans:
+        secs = plan['events'] / eventsPerSec if eventsPerSec and plan['events'] is not None else None
+        totalSecs = totalSecs + secs if secs is not None and totalSecs is not None else None
+        print("{} {}: files={} MB={:.2f} events={} filtered events={} estimated duration={}".format(
+            plan['date'], plan['prefix'], plan['files'], plan['bytes'] / 1048576.0, plan['events'],
+            plan['filteredEvents'], formatDuration(secs)))
+    # dates run max_concurrent_dates at a time
+    if totalSecs is not None:
+        totalSecs = totalSecs / min(max_concurrent_dates, max(len(plans), 1))
+    print("Total: dates={} files={} MB={:.2f} throughput={} events/sec estimated duration={}".format(
+        len(plans), sum(plan['files'] for plan in plans), sum(plan['bytes'] for plan in plans) / 1048576.0,
+        "{:.2f}".format(eventsPerSec) if eventsPerSec else "unknown", formatDuration(totalSecs)))
 
+dateRange = getDates(start_date, end_date)
+print(dateRange)
+print(delete_backups)
+filters = getFilterDetails(config_json, prefix)
+print(getFilterStr(filters))
+if args.plan:
+    planReplay(dateRange)
+    sys.exit(0)
+# one session is shared by all the dates replayed concurrently
+spark = getSparkSession()
+try:
+    results = runDates(dateRange, replayDate, max_concurrent_dates)
+finally:
+    spark.stop()
+if delete_backups == "True":
+    # includes dates cleaned by an earlier run that stopped before disabling their segments
+    cleanedDates = [date for date in dateRange if isStepDone(state_dir, prefix, date, cleanedStep)
+                    and not isStepDone(state_dir, prefix, date, segmentsDisabledStep)]
+    for rangeStart, rangeEnd in getDateRanges(cleanedDates):
+        rangeDates = [date for date in cleanedDates if rangeStart <= date <= rangeEnd]
+        try:
+            disableDruidSegments(getBackUpDetails(config_json, prefix), rangeStart, rangeEnd)
+        except Exception:
+            print("Disabling druid segments failed for {} to {}".format(rangeStart.strftime('%Y-%m-%d'),
+                                                                        rangeEnd.strftime('%Y-%m-%d')))
+            traceback.print_exc()
+            for date in rangeDates:
+                markStep(state_dir, prefix, date, segmentsDisableFailedStep)
+                results[date] = False
+            continue
+        for date in rangeDates:
+            markStep(state_dir, prefix, date, segmentsDisabledStep)
+failedDates = [date.strftime('%Y-%m-%d') for date, success in results.items() if not success]
+if failedDates:
+    print("Replay failed for: {}. Rerun with the same state_dir to resume".format(', '.join(sorted(failedDates))))
+    sys.exit(1)
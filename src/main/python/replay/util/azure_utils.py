@@ -2,35 +2,45 @@ import os
 import json
 from pathlib import Path
 from azure.storage.blob import BlockBlobService
+from transfer_utils import AzureBlobBackend, LocalBlobBackend, copyBlobs, deleteBlobs
+from dataproducts.util.storage_utils import get_storage_backend, get_local_storage_path, get_container_uri, configure_spark_storage
 
 #del os.environ['PYSPARK_SUBMIT_ARGS']
-account_name = os.environ['AZURE_STORAGE_ACCOUNT']
-account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
-block_blob_service = BlockBlobService(account_name=account_name, account_key=account_key)
+# 'wasbs' reads the blob containers, 'file' reads <LOCAL_STORAGE_PATH>/<container>/<prefix>/<date>-* locally
+storage_backend = get_storage_backend()
+account_name = os.environ.get('AZURE_STORAGE_ACCOUNT')
+account_key = os.environ.get('AZURE_STORAGE_ACCESS_KEY')
+if storage_backend == 'wasbs':
+    block_blob_service = BlockBlobService(account_name=account_name, account_key=account_key)
+    blob_backend = AzureBlobBackend(block_blob_service, account_name)
+else:
+    blob_backend = LocalBlobBackend(get_local_storage_path())
+max_transfer_workers = int(os.environ.get('MAX_TRANSFER_WORKERS', 16))
 
 def listBlobs(container, prefix, date):
     key = '{}/{}'.format(prefix, date.strftime('%Y-%m-%d'))
-    return list(block_blob_service.list_blob_names(container, key))
+    return blob_backend.listBlobs(container, key)
 
 # copy the files to backup folder
 def copy_data(container, prefix, destination_path, date):
     filesList = listBlobs(container, prefix, date)
-    for file in filesList:
-        source = "https://{}.blob.core.windows.net/{}/{}".format(account_name, container, file)
-        dest = file.split('/')[1]
-        block_blob_service.copy_blob(container, '{}/{}'.format(destination_path, dest), source)
-    # command = 'az storage blob copy start-batch --connection-string "AccountName={};AccountKey={};EndpointSuffix=core.windows.net;DefaultEndpointsProtocol=https;" --source-container {} --destination-container {} --destination-path {} --pattern {}/{}*.gz'.format(account_name, account_key, container, container, destination_path, prefix, date.strftime('%Y-%m-%d'))
-    # print(command)
-    # stream = os.popen(command)
-    # output = stream.read()
-    # output
+    return copyBlobs(blob_backend, container, filesList, prefix, destination_path, max_transfer_workers)
 
 # delete files
 def delete_data(container, prefix, date):
-    command = 'az storage blob delete-batch -s {} --connection-string "AccountName={};AccountKey={};EndpointSuffix=core.windows.net;DefaultEndpointsProtocol=https;" --pattern {}/{}*.gz'.format(container, account_name, account_key, prefix, date.strftime('%Y-%m-%d'))
-    os.system(command)
+    filesList = [blob for blob in listBlobs(container, prefix, date) if blob[0].endswith('.gz')]
+    return deleteBlobs(blob_backend, container, filesList, max_transfer_workers)
 
 # read and return data
 def get_data_path(container, prefix, date):
-    path = 'wasbs://{}@{}.blob.core.windows.net/{}/{}-*'.format(container, account_name, prefix, date.strftime('%Y-%m-%d'))
-    return path
+    return '{}/{}/{}-*'.format(get_container_uri(container), prefix, date.strftime('%Y-%m-%d'))
+
+# path of a single blob, as listed by listBlobs
+def get_blob_path(container, blob):
+    if storage_backend == 'file':
+        return 'file://{}'.format(os.path.abspath(blob_backend.getPath(container, blob)))
+    return '{}/{}'.format(get_container_uri(container), blob)
+
+# set spark credentials for the storage backend
+def set_spark_credentials(spark):
+    configure_spark_storage(spark)
@@ -0,0 +1,96 @@
+import re
+from pyspark.sql import functions as func
+from pyspark.sql.types import StructType, StructField, StringType
+
+# replay_config filter operators compiled to spark column expressions
+comparisons = {
+    '=': lambda column, value: column == value,
+    '==': lambda column, value: column == value,
+    '!=': lambda column, value: column != value,
+    '<>': lambda column, value: column != value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value,
+    'like': lambda column, value: column.like(value),
+    'not like': lambda column, value: ~column.like(value),
+    'in': lambda column, value: column.isin([item.strip() for item in value.split(',')]),
+    'not in': lambda column, value: ~column.isin([item.strip() for item in value.split(',')])
+}
+# fields are parsed as strings, so these compare as numbers when the filter value is a number
+orderedOperators = ('>', '>=', '<', '<=')
+nullChecks = {
+    'is null': lambda column: column.isNull(),
+    'is not null': lambda column: column.isNotNull()
+}
+fieldKey = re.compile(r'^\w+(\.\w+)*$')
+# values that appear verbatim in the raw json line when they match
+plainValue = re.compile(r'^[\w.:\- ]+$')
+
+def getOperator(filter):
+    return ' '.join(filter['operator'].lower().split())
+
+def isCompilable(filters):
+    return all(fieldKey.match(filter['key']) and (getOperator(filter) in comparisons or getOperator(filter) in nullChecks)
+               for filter in filters)
+
+# schema with only the filtered fields, read as strings, so the rest of the event is never parsed
+def getPrunedSchema(filters):
+    tree = {}
+    for filter in filters:
+        parts = filter['key'].split('.')
+        node = tree
+        for part in parts[:-1]:
+            if node.get(part) is None:
+                node[part] = {}
+            node = node[part]
+        node.setdefault(parts[-1], None)
+    return toStruct(tree)
+
+def toStruct(tree):
+    return StructType([StructField(name, StringType() if child is None else toStruct(child))
+                       for name, child in tree.items()])
+
+def toNumber(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+# cast the column to the type of the filter value, as the sql filter does, so "9" > "10" compares 9 with 10
+def getOperands(operator, column, value):
+    number = toNumber(value) if operator in orderedOperators else None
+    if number is None:
+        return column, value
+    return column.cast('double'), number
+
+# cheap substring checks on the raw line that every matching event passes
+def compilePrefilter(filters, line):
+    checks = []
+    for filter in filters:
+        operator = getOperator(filter)
+        if operator == 'is not null':
+            checks.append(line.contains('"{}"'.format(filter['key'].split('.')[-1])))
+        elif operator in ('=', '==') and filter['value'] and plainValue.match(filter['value']):
+            checks.append(line.contains(filter['value']))
+    return checks
+
+# keep column for raw json lines, the prefilter runs first so non matching lines skip json parsing
+def getKeepColumn(filters, line):
+    if not filters:
+        return func.lit(True)
+    fields = func.from_json(line, getPrunedSchema(filters))
+    checks = compilePrefilter(filters, line)
+    for filter in filters:
+        column = fields
+        for part in filter['key'].split('.'):
+            column = column.getField(part)
+        operator = getOperator(filter)
+        if operator in nullChecks:
+            checks.append(nullChecks[operator](column))
+        else:
+            checks.append(comparisons[operator](*getOperands(operator, column, filter['value'])))
+    keep = checks[0]
+    for check in checks[1:]:
+        keep = keep & check
+    return keep
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, text
 
 # user_name = os.environ['POSTGRES_USERNAME']
 # password = os.environ['POSTGRES_PASSWORD']
@@ -7,13 +8,35 @@ user_name = 'sowmya'
 password = ''
 host_name = 'localhost'
 
-def executeQuery(db_name, query_str):
+# one pooled engine per database, shared by all the dates replayed concurrently
+engines = {}
+enginesLock = threading.Lock()
+
+disableSegmentsQuery = text("update druid_segments set used='f' where created_date >= :start_date and created_date <= :end_date and datasource = any(:datasources) and used='t'")
+
+def executeQuery(db_name, query_str, params=None):
     print(query_str)
     db = getDbEngine(db_name)
-    result_set = db.execute(query_str)  
-    return result_set
+    # run in a transaction so multi row updates are applied together or not at all
+    with db.begin() as connection:
+        result_set = connection.execute(text(query_str) if isinstance(query_str, str) else query_str, params or {})
+        return result_set.rowcount
 
 def getDbEngine(db_name):
-    db_string = 'postgres://{}:{}@{}:5432/{}'.format(user_name, password, host_name, db_name)
-    db = create_engine(db_string)
-    return db
+    with enginesLock:
+        if db_name not in engines:
+            db_string = 'postgres://{}:{}@{}:5432/{}'.format(user_name, password, host_name, db_name)
+            engines[db_name] = create_engine(db_string, pool_size=5, max_overflow=5, pool_pre_ping=True)
+        return engines[db_name]
+
+def disableSegments(db_name, datasources, start_date, end_date):
+    # disable the segments of all the datasources created between start_date and end_date in one statement
+    params = {
+        'start_date': start_date.strftime('%Y-%m-%d %H:%M:%S'),
+        'end_date': end_date.strftime('%Y-%m-%d %H:%M:%S'),
+        'datasources': list(datasources)
+    }
+    print("Disabling segments of {} from {} to {}".format(', '.join(params['datasources']), params['start_date'], params['end_date']))
+    segments = executeQuery(db_name, disableSegmentsQuery, params)
+    print("Disabled {} segments".format(segments))
+    return segments
@@ -0,0 +1,69 @@
+import time
+import threading
+
+# events/sec budget of a single sender, refilled continuously with at most a tenth of a second of burst
+class TokenBucket:
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.capacity = max(self.rate / 10, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def setRate(self, rate):
+        with self.lock:
+            self.refill()
+            self.rate = float(rate)
+            self.capacity = max(self.rate / 10, 1.0)
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+# halves the bucket rate while the smoothed send latency is above target and adds back a tenth of the
+# max rate per interval once it is below
+class LatencyBackoff:
+    def __init__(self, bucket, targetLatency, interval=1.0):
+        self.bucket = bucket
+        self.maxRate = bucket.rate
+        self.minRate = max(bucket.rate / 100, 1.0)
+        self.targetLatency = targetLatency
+        self.interval = interval
+        self.latency = None
+        self.backoffs = 0
+        self.lastAdjusted = time.time()
+        self.lock = threading.Lock()
+
+    # called from the producer callbacks
+    def record(self, latency):
+        with self.lock:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+    # called from the sending loop
+    def adjust(self):
+        now = time.time()
+        if now - self.lastAdjusted < self.interval:
+            return
+        self.lastAdjusted = now
+        with self.lock:
+            latency = self.latency
+        if latency is None:
+            return
+        if latency > self.targetLatency:
+            rate = max(self.minRate, self.bucket.rate / 2)
+            self.backoffs += 1
+        else:
+            rate = min(self.maxRate, self.bucket.rate + self.maxRate / 10)
+        if rate != self.bucket.rate:
+            self.bucket.setRate(rate)
@@ -1,6 +1,7 @@
-import os
 import sys
 import json
+import time
+import hashlib
 import findspark
 from pyspark.sql import SparkSession
 from pyspark.sql.functions import udf
@@ -8,40 +9,183 @@ from pyspark.sql import functions as func
 from pathlib import Path
 from datetime import date, timedelta, datetime
 from pyspark.sql.types import StringType
-from azure_utils import copy_data, delete_data, get_data_path
-from postgres_utils import executeQuery
+from azure_utils import copy_data, delete_data, get_data_path, set_spark_credentials, listBlobs, get_blob_path
+from postgres_utils import disableSegments
+from filter_utils import isCompilable, getKeepColumn
+from rate_utils import TokenBucket, LatencyBackoff
 import json
 from kafka import KafkaProducer
 from kafka.errors import KafkaError
+from dataproducts.util.kafka_utils import push_metrics
+from dataproducts.resources.common import common_config
 
 findspark.init()
 
-pgDisableSegmentsQuery = "update druid_segments set used='f' where created_date >= '{}' and created_date <= '{}' and datasource = '{}' and used='t'"
+defaultProducerConfig = {
+    'linger_ms': 20,
+    'batch_size': 262144,
+    'compression_type': 'gzip'
+}
 
-def push_data(broker_host, topic, container, prefix, date, filters):
+defaultTargetLatencyMs = 500
+
+druidMetadataDb = 'postgis_test'
+
+def getSparkSession():
+    spark = SparkSession.builder.appName("data_replay").master("local[*]") \
+        .config("spark.scheduler.mode", "FAIR").getOrCreate()
+    set_spark_credentials(spark)
+    return spark
+
+def push_data(broker_host, topic, container, prefix, date, filters, producerConfig=None, spark=None, eventsPerSec=None,
+              targetLatencyMs=defaultTargetLatencyMs):
     path = get_data_path(container, prefix, date)
     print(path)
     # path = "wasbs://dev-data-store@sunbirddevtelemetry.blob.core.windows.net/unique/2020-01-01-1577818009896.json.gz"
-    account_name = os.environ['AZURE_STORAGE_ACCOUNT']
-    account_key = os.environ['AZURE_STORAGE_ACCESS_KEY']
-    spark = SparkSession.builder.appName("data_replay").master("local[*]").getOrCreate()
-    spark.conf.set('fs.azure.account.key.{}.blob.core.windows.net'.format(account_name), account_key)
-    df = spark.read.json(path)
-    inputCount = df.count()
-    print(inputCount)
-    if filters:
-        filteredDf = df.filter(filters)
-    else :
-        filteredDf = df
-    print(filteredDf.count())
-    def push_data_kafka(events):
-        kafka_producer = KafkaProducer(bootstrap_servers=[broker_host])
-        for event in events:
-            kafka_producer.send(topic, bytearray(event, 'utf-8'))
-            kafka_producer.flush()
-    filteredDf.toJSON().foreachPartition(push_data_kafka)
-    spark.stop()
-    
+    # a session passed in is shared with other dates and is stopped by the caller
+    ownSession = spark is None
+    if ownSession:
+        spark = getSparkSession()
+    events = readEvents(spark, path, filters)
+    config = getProducerConfig(producerConfig)
+    # python workers do not share memory, so the budget is split evenly over the partitions that run at the same time
+    concurrentPartitions = max(1, min(events.rdd.getNumPartitions(), spark.sparkContext.defaultParallelism))
+    partitionEventsPerSec = eventsPerSec / concurrentPartitions if eventsPerSec else None
+    def push_data_kafka(index, rows):
+        stats = {'partition': index, 'input': 0, 'sent': 0, 'acked': 0, 'errors': 0, 'bytes': 0, 'backoffs': 0,
+                 'topicPartitions': {}}
+        bucket = TokenBucket(partitionEventsPerSec) if partitionEventsPerSec else None
+        backoff = LatencyBackoff(bucket, targetLatencyMs / 1000.0) if bucket else None
+        def onSuccess(sentAt, size, metadata):
+            stats['acked'] += 1
+            topicPartition = stats['topicPartitions'].setdefault('{}:{}'.format(metadata.topic, metadata.partition),
+                                                                 {'events': 0, 'bytes': 0})
+            topicPartition['events'] += 1
+            topicPartition['bytes'] += size
+            if backoff:
+                backoff.record(time.time() - sentAt)
+        def onError(exc):
+            stats['errors'] += 1
+        kafka_producer = KafkaProducer(bootstrap_servers=[broker_host], **config)
+        startTime = time.time()
+        for row in rows:
+            stats['input'] += 1
+            if not row.keep:
+                continue
+            if bucket:
+                bucket.acquire()
+                backoff.adjust()
+            data = bytearray(row.event, 'utf-8')
+            kafka_producer.send(topic, data).add_callback(onSuccess, time.time(), len(data)).add_errback(onError)
+            stats['sent'] += 1
+            stats['bytes'] += len(data)
+        kafka_producer.flush()
+        kafka_producer.close()
+        stats['secs'] = time.time() - startTime
+        stats['backoffs'] = backoff.backoffs if backoff else 0
+        yield stats
+    partitionStats = events.rdd.mapPartitionsWithIndex(push_data_kafka).collect()
+    if ownSession:
+        spark.stop()
+    totals = reportThroughput(partitionStats)
+    print("Input events: {}, filtered events pushed: {}".format(totals['input'], totals['sent']))
+    pushReplayMetrics(broker_host, prefix, date, totals)
+    # raised so the caller restores the backup instead of marking the date as pushed
+    if totals['errors'] > 0 or totals['acked'] < totals['sent']:
+        raise Exception("Delivery failed for {} of {} events, {} acked".format(
+            totals['sent'] - totals['acked'], totals['sent'], totals['acked']))
+    return totals
+
+# read events with a keep column for the filters, evaluated in the same pass that pushes the events so
+# input and output are counted together. events are pushed as the original json lines, only the filtered
+# fields are parsed, falling back to a full parse for filters that can not be compiled
+def readEvents(spark, path, filters):
+    if filters and not isCompilable(filters):
+        df = spark.read.json(path)
+        return df.select(func.expr(getFilterStr(filters)).alias('keep'),
+                         func.to_json(func.struct(*['`{}`'.format(column) for column in df.columns])).alias('event'))
+    lines = spark.read.text(path).filter(func.trim(func.col('value')) != '')
+    return lines.select(getKeepColumn(filters, func.col('value')).alias('keep'), func.col('value').alias('event'))
+
+# list the blobs of a date and estimate its events from a sample of evenly spaced files, nothing is written
+def planDate(container, prefix, date, filters, sampleFiles=0, spark=None):
+    blobs = listBlobs(container, prefix, date)
+    plan = {'date': date.strftime('%Y-%m-%d'), 'prefix': prefix, 'files': len(blobs),
+            'bytes': sum(size for name, size in blobs), 'sampledFiles': 0, 'events': None, 'filteredEvents': None}
+    if not blobs or sampleFiles <= 0 or spark is None:
+        return plan
+    sample = blobs[::max(1, len(blobs) // sampleFiles)][:sampleFiles]
+    events = readEvents(spark, [get_blob_path(container, name) for name, size in sample], filters)
+    counts = events.select(func.col('keep').cast('int').alias('keep')) \
+        .agg(func.count(func.lit(1)).alias('input'), func.sum('keep').alias('kept')).first()
+    sampleBytes = sum(size for name, size in sample)
+    # scale the sampled counts by size, files of a date are of similar density
+    scale = plan['bytes'] / sampleBytes if sampleBytes else 0
+    plan['sampledFiles'] = len(sample)
+    plan['events'] = int(counts['input'] * scale)
+    plan['filteredEvents'] = int((counts['kept'] or 0) * scale)
+    return plan
+
+# send the counts of a pushed date as a METRIC event, through the process wide emitter that flushes at exit
+def pushReplayMetrics(broker_host, prefix, date, totals):
+    ets = int(round(time.time() * 1000))
+    metricsList = [{'metric': 'inputEvents', 'value': totals['input']},
+                   {'metric': 'filteredEvents', 'value': totals['sent']},
+                   {'metric': 'ackedEvents', 'value': totals['acked']},
+                   {'metric': 'failedEvents', 'value': totals['errors']},
+                   {'metric': 'bytes', 'value': totals['bytes']},
+                   {'metric': 'wallSecs', 'value': round(totals['secs'], 3)}]
+    metric = {
+        "eid": "METRIC",
+        "ver": "3.0",
+        "ets": ets,
+        "mid": hashlib.md5("METRIC{}{}{}".format(ets, prefix, date.strftime('%Y-%m-%d')).encode()).hexdigest(),
+        "@timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S+0000"),
+        "actor": {"id": "analytics", "type": "System"},
+        "context": {
+            "channel": "data-pipeline",
+            "env": "",
+            "pdata": {"id": "pipeline.monitoring", "ver": "1.0", "pid": "replay.job.metrics"}
+        },
+        "edata": {
+            "system": "DataReplay",
+            "subsystem": "{}:{}".format(prefix, date.strftime('%Y-%m-%d')),
+            "metrics": metricsList
+        }
+    }
+    push_metrics(broker_host, common_config.init()['kafka_metrics_topic'], metric)
+
+def getProducerConfig(producerConfig=None):
+    config = dict(defaultProducerConfig)
+    if producerConfig:
+        config.update({key: value for key, value in producerConfig.items() if value is not None})
+    if config['compression_type'] == 'none':
+        config['compression_type'] = None
+    return config
+
+def reportThroughput(partitionStats):
+    totals = {'input': 0, 'sent': 0, 'acked': 0, 'errors': 0, 'bytes': 0, 'backoffs': 0, 'secs': 0, 'topicPartitions': {}}
+    for stats in partitionStats:
+        secs = max(stats['secs'], 1e-6)
+        print("Partition {}: sent={} acked={} errors={} backoffs={} events/sec={:.2f} bytes/sec={:.2f}".format(
+            stats['partition'], stats['sent'], stats['acked'], stats['errors'], stats['backoffs'], stats['sent'] / secs,
+            stats['bytes'] / secs))
+        for key in ['input', 'sent', 'acked', 'errors', 'bytes', 'backoffs']:
+            totals[key] += stats[key]
+        for topicPartition, counts in stats['topicPartitions'].items():
+            total = totals['topicPartitions'].setdefault(topicPartition, {'events': 0, 'bytes': 0})
+            total['events'] += counts['events']
+            total['bytes'] += counts['bytes']
+        # partitions run concurrently, so the slowest one bounds the wall time
+        totals['secs'] = max(totals['secs'], stats['secs'])
+    secs = max(totals['secs'], 1e-6)
+    for topicPartition, counts in sorted(totals['topicPartitions'].items()):
+        print("Topic partition {}: events={} events/sec={:.2f} bytes/sec={:.2f}".format(
+            topicPartition, counts['events'], counts['events'] / secs, counts['bytes'] / secs))
+    print("Total: sent={} acked={} errors={} backoffs={} events/sec={:.2f} bytes/sec={:.2f}".format(
+        totals['sent'], totals['acked'], totals['errors'], totals['backoffs'], totals['sent'] / secs,
+        totals['bytes'] / secs))
+    return totals
 
 def getDates(start, end):
     dates = []
@@ -79,10 +223,13 @@ def deleteBackupData(sinkSourcesList, container, date):
         if sink['type'] == 'azure':
             backup_dir = 'backup-{}/{}'.format(sink['prefix'], sink['prefix'])
             delete_data(container, backup_dir, date)
-        if sink['type'] == 'druid':
-            end_date = date + timedelta(1)
-            disableQuery = pgDisableSegmentsQuery.format(date.strftime('%Y-%m-%d %H:%M:%S'), end_date.strftime('%Y-%m-%d %H:%M:%S'), sink['prefix'])
-            segments = executeQuery('postgis_test', disableQuery)
+
+# disable the druid segments of all druid sinks for the dates from start_date to end_date, both included
+def disableDruidSegments(sinkSourcesList, start_date, end_date):
+    datasources = [sink['prefix'] for sink in sinkSourcesList if sink['type'] == 'druid']
+    if not datasources:
+        return 0
+    return disableSegments(druidMetadataDb, datasources, start_date, end_date + timedelta(1))
 
 def restoreBackupData(sinkSourcesList, container, date):
     for sink in sinkSourcesList:
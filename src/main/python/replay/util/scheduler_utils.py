@@ -0,0 +1,90 @@
+import os
+import json
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# steps of a single date replay, in the order they complete
+backedUpStep = 'backed-up'
+pushedStep = 'pushed'
+cleanedStep = 'cleaned'
+# druid segments are disabled once for a whole range of cleaned dates
+segmentsDisabledStep = 'segments-disabled'
+# disabling the segments of the range failed, the next run retries every cleaned date without segmentsDisabledStep
+segmentsDisableFailedStep = 'segments-disable-failed'
+# a push that failed after its backups were restored, the next run starts the date over
+failedStep = 'failed'
+# a push that failed and whose backups could not be restored, the next run retries the restore first
+restoreFailedStep = 'restore-failed'
+
+def getStatePath(stateDir, prefix, date):
+    return os.path.join(stateDir, '{}-{}.json'.format(prefix.replace('/', '_'), date.strftime('%Y-%m-%d')))
+
+def readState(stateDir, prefix, date):
+    path = getStatePath(stateDir, prefix, date)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {'date': date.strftime('%Y-%m-%d'), 'prefix': prefix, 'steps': []}
+
+def isStepDone(stateDir, prefix, date, step):
+    return step in readState(stateDir, prefix, date)['steps']
+
+def markStep(stateDir, prefix, date, step, stats=None):
+    os.makedirs(stateDir, exist_ok=True)
+    state = readState(stateDir, prefix, date)
+    if step not in state['steps']:
+        state['steps'].append(step)
+    if stats is not None:
+        state.setdefault('stats', {})[step] = stats
+    state['updatedOn'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    path = getStatePath(stateDir, prefix, date)
+    # write to a temp file and rename so an interrupted run never leaves a half written state
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+def clearState(stateDir, prefix, date):
+    path = getStatePath(stateDir, prefix, date)
+    if os.path.exists(path):
+        os.remove(path)
+
+# input events per second over all the pushes recorded in stateDir, None if nothing was pushed yet
+def getMeasuredThroughput(stateDir):
+    events = 0
+    secs = 0
+    if os.path.isdir(stateDir):
+        for fileName in os.listdir(stateDir):
+            if not fileName.endswith('.json'):
+                continue
+            with open(os.path.join(stateDir, fileName), 'r') as f:
+                stats = json.load(f).get('stats', {}).get(pushedStep)
+            if stats:
+                events += stats['input']
+                secs += stats['secs']
+    return events / secs if secs else None
+
+def runDates(dates, replayDate, maxConcurrentDates):
+    results = {}
+    with ThreadPoolExecutor(max_workers=maxConcurrentDates) as executor:
+        futures = {executor.submit(replayDate, date): date for date in dates}
+        for future in as_completed(futures):
+            date = futures[future]
+            try:
+                future.result()
+                results[date] = True
+            except Exception:
+                print("Replay failed for {}. Continuing replay for remaining dates".format(date.strftime('%Y-%m-%d')))
+                traceback.print_exc()
+                results[date] = False
+    return results
+
+# group dates into (start, end) ranges of consecutive days
+def getDateRanges(dates):
+    ranges = []
+    for date in sorted(dates):
+        if ranges and date - ranges[-1][1] == timedelta(1):
+            ranges[-1] = (ranges[-1][0], date)
+        else:
+            ranges.append((date, date))
+    return ranges
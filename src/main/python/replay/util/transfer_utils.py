@@ -0,0 +1,97 @@
+import os
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+# blob copies run server side, so the workers only start copies and poll their status
+defaultMaxWorkers = 16
+defaultPollInterval = 2
+
+class AzureBlobBackend:
+    def __init__(self, blockBlobService, accountName):
+        self.service = blockBlobService
+        self.accountName = accountName
+
+    def listBlobs(self, container, prefix):
+        return [(blob.name, blob.properties.content_length) for blob in self.service.list_blobs(container, prefix)]
+
+    def startCopy(self, container, source, destination):
+        sourceUrl = "https://{}.blob.core.windows.net/{}/{}".format(self.accountName, container, source)
+        return self.service.copy_blob(container, destination, sourceUrl).status
+
+    def copyStatus(self, container, destination):
+        return self.service.get_blob_properties(container, destination).properties.copy.status
+
+    def deleteBlob(self, container, blob):
+        self.service.delete_blob(container, blob)
+
+class LocalBlobBackend:
+    # stand-in for blob storage on a local folder, laid out as <root>/<container>/<blob name>
+    def __init__(self, root):
+        self.root = root
+
+    def getPath(self, container, blob):
+        return os.path.join(self.root, container, *blob.split('/'))
+
+    def listBlobs(self, container, prefix):
+        containerPath = os.path.join(self.root, container)
+        blobs = []
+        for dirPath, dirNames, fileNames in os.walk(containerPath):
+            for fileName in fileNames:
+                path = os.path.join(dirPath, fileName)
+                name = os.path.relpath(path, containerPath).replace(os.sep, '/')
+                if name.startswith(prefix):
+                    blobs.append((name, os.path.getsize(path)))
+        return sorted(blobs)
+
+    def startCopy(self, container, source, destination):
+        destinationPath = self.getPath(container, destination)
+        os.makedirs(os.path.dirname(destinationPath), exist_ok=True)
+        shutil.copyfile(self.getPath(container, source), destinationPath)
+        return 'success'
+
+    def copyStatus(self, container, destination):
+        return 'success' if os.path.exists(self.getPath(container, destination)) else 'failed'
+
+    def deleteBlob(self, container, blob):
+        os.remove(self.getPath(container, blob))
+
+def reportProgress(action, done, total, totalBytes, startTime):
+    secs = max(time.time() - startTime, 1e-6)
+    print("{} {}/{} blobs, {:.2f} MB in {:.1f} secs ({:.2f} MB/s)".format(
+        action, done, total, totalBytes / 1048576.0, secs, totalBytes / 1048576.0 / secs))
+
+def copyBlobs(backend, container, blobs, prefix, destinationPath, maxWorkers=defaultMaxWorkers,
+              pollInterval=defaultPollInterval):
+    # blobs are (name, size) tuples listed under prefix, copied to the same relative name under destinationPath
+    if not blobs:
+        return 0
+    startTime = time.time()
+    copies = {'{}/{}'.format(destinationPath, name[len(prefix):].lstrip('/')): size for name, size in blobs}
+    sources = dict(zip(copies.keys(), [name for name, size in blobs]))
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        statuses = dict(zip(copies.keys(), executor.map(
+            lambda destination: backend.startCopy(container, sources[destination], destination), copies.keys())))
+        pending = [destination for destination, status in statuses.items() if status == 'pending']
+        while pending:
+            time.sleep(pollInterval)
+            polled = executor.map(lambda destination: backend.copyStatus(container, destination), pending)
+            statuses.update(dict(zip(pending, polled)))
+            pending = [destination for destination, status in statuses.items() if status == 'pending']
+            done = len(copies) - len(pending)
+            reportProgress("Copied", done, len(copies),
+                           sum(copies[destination] for destination in copies if destination not in pending), startTime)
+    failed = [destination for destination, status in statuses.items() if status != 'success']
+    if failed:
+        raise Exception("Copy failed for {} of {} blobs: {}".format(len(failed), len(copies), ', '.join(sorted(failed))))
+    reportProgress("Copied", len(copies), len(copies), sum(copies.values()), startTime)
+    return len(copies)
+
+def deleteBlobs(backend, container, blobs, maxWorkers=defaultMaxWorkers):
+    if not blobs:
+        return 0
+    startTime = time.time()
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        list(executor.map(lambda blob: backend.deleteBlob(container, blob[0]), blobs))
+    reportProgress("Deleted", len(blobs), len(blobs), sum(size for name, size in blobs), startTime)
+    return len(blobs)